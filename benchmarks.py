@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the recommendation hot path
+
+Times analyze_story_text, calculate_premium_price,
+generate_premium_suggestions, generate_story_connection and
+generate_premium_rationale on a fixed corpus of short, median and very
+long stories and on every budget range, inventory top-k retrieval over
+synthetic inventories of up to a million SKUs, and similar-design
+lookups, then compares the results with a stored baseline. Exits non-zero when a benchmark regresses past the
+threshold.
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import inventory
+import main
+import similarity
+
+BASELINE_PATH = Path(__file__).with_name("benchmark_baseline.json")
+
+SHORT_STORY = main.StoryData(
+    love_story="We met at a beach during sunset.",
+    personality="Romantic"
+)
+
+MEDIAN_STORY = main.StoryData(
+    love_story="We met hiking in the mountains, and I proposed at sunset by the lake where we "
+               "first said I love you. Her grandmother's heirloom ring has always inspired her.",
+    personality="She's creative and artistic, a painter with a quiet, refined style",
+    style_preferences="Vintage details, rose gold, nothing too flashy",
+    special_moments="The way she laughs at my jokes, her paint-covered hands, her eyes at golden hour"
+)
+
+LONG_STORY = main.StoryData(
+    love_story=" ".join([MEDIAN_STORY.love_story] * 200),
+    personality=" ".join([MEDIAN_STORY.personality] * 50),
+    style_preferences=" ".join([MEDIAN_STORY.style_preferences] * 50),
+    special_moments=" ".join([MEDIAN_STORY.special_moments] * 50)
+)
+
+STORIES = {"short": SHORT_STORY, "median": MEDIAN_STORY, "long": LONG_STORY}
+
+INVENTORY_SIZES = (100_000, 1_000_000)
+
+BUDGET_RANGES = list(main.BUDGET_RANGES) + [None]
+
+DESIGN = {
+    "stone_shape": "cushion",
+    "stone_type": "diamond",
+    "metal_type": "rose_gold",
+    "stone_clarity": "VVS1",
+    "carat_weight": 1.42,
+    "stone_color": "E",
+    "setting_type": "halo"
+}
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    """Benchmark name -> zero-argument callable"""
+    cases = {}
+    analysis = main.analyze_story_text(MEDIAN_STORY)
+
+    for name, story in STORIES.items():
+        cases[f"analyze_story_text[{name}]"] = lambda story=story: main.analyze_story_text(story)
+
+    shapes = list(main.PREMIUM_JEWELRY_DATA["diamonds"])
+    metals = list(main.PREMIUM_JEWELRY_DATA["premium_metals"])
+
+    def price_all():
+        for shape in shapes:
+            for metal in metals:
+                main.calculate_premium_price(shape, 1.25, metal, setting_complexity=1.3, story_premium=True)
+
+    cases["calculate_premium_price[x%d]" % (len(shapes) * len(metals))] = price_all
+
+    for budget in BUDGET_RANGES:
+        preferences = main.PremiumPreferences(budget_range=budget)
+        cases[f"generate_premium_suggestions[{budget or 'default'}]"] = (
+            lambda preferences=preferences: main.generate_premium_suggestions(
+                analysis, MEDIAN_STORY, preferences, rng=random.Random(7)
+            )
+        )
+
+    colored = main.PremiumPreferences(budget_range="10000-20000", center_stone="alternative")
+    cases["generate_premium_suggestions[colored_stones]"] = (
+        lambda: main.generate_premium_suggestions(analysis, MEDIAN_STORY, colored, rng=random.Random(7))
+    )
+    # Specs only, as requested with fields= by grid and CRM clients
+    cases["generate_premium_suggestions[specs_only]"] = (
+        lambda: main.generate_premium_suggestions(analysis, MEDIAN_STORY, main.PremiumPreferences(),
+                                                  rng=random.Random(7), narrative=())
+    )
+
+    for name, story in STORIES.items():
+        story_analysis = main.analyze_story_text(story)
+        cases[f"generate_story_connection[{name}]"] = (
+            lambda story=story, story_analysis=story_analysis: main.generate_story_connection(
+                DESIGN, story_analysis, story, random.Random(7)
+            )
+        )
+
+    for approach in main.SUGGESTION_APPROACHES:
+        focus = approach["focus"]
+        cases[f"generate_premium_rationale[{focus}]"] = (
+            lambda focus=focus: main.generate_premium_rationale(DESIGN, focus, analysis)
+        )
+
+    for size in INVENTORY_SIZES:
+        cases[f"inventory_top_k[{size}]"] = lambda size=size: synthetic_inventory(size).top_k(
+            3, analysis.themes, ["diamond"], analysis.recommended_elements["shapes"],
+            analysis.recommended_elements["metals"], main.BUDGET_RANGES["10000-20000"]
+        )
+
+    cases["similar_designs[100000]"] = lambda: similar_designs(100_000).similar("LUM-00000042", 6)
+
+    return cases
+
+
+@lru_cache(maxsize=None)
+def similar_designs(size: int) -> similarity.SimilarDesigns:
+    index = similarity.SimilarDesigns(
+        similarity.DesignEncoder(main.catalog_watcher.current.catalog, main.SIMILARITY_TAGS),
+        synthetic_inventory(size), capacity=1
+    )
+    index.build()
+    return index
+
+
+@lru_cache(maxsize=None)
+def synthetic_inventory(size: int) -> inventory.Inventory:
+    """Built on first use, so filtered runs skip the build"""
+    return inventory.synthetic_inventory(main.catalog_watcher.current.catalog, size, list(main.STORY_KEYWORDS))
+
+
+def time_case(func: Callable, min_time: float, repeats: int) -> float:
+    """Best-of-``repeats`` operations per second, each repeat running at least ``min_time``"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 10:
+            break
+        loops *= 2
+    loops = max(1, int(loops * (min_time / elapsed)))
+
+    best = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(loops):
+                func()
+            best = min(best, (time.perf_counter() - started) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return 1.0 / best
+
+
+def measure_allocations(func: Callable) -> Tuple[int, int]:
+    """Peak traced bytes and memory blocks allocated by one call (result kept alive)"""
+    func()  # Warm caches so only per-call allocations are counted
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline_size = tracemalloc.get_traced_memory()[0]
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1] - baseline_size
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del result
+    return peak, blocks
+
+
+def run_benchmarks(pattern: str = "", min_time: float = 0.2, repeats: int = 5) -> Dict[str, Dict]:
+    results = {}
+    for name, func in build_cases().items():
+        if pattern and pattern not in name:
+            continue
+        func()  # Warm up, including any one-time fixture setup
+        ops_per_sec = time_case(func, min_time, repeats)
+        peak_bytes, blocks = measure_allocations(func)
+        results[name] = {
+            "ops_per_sec": round(ops_per_sec, 1),
+            "peak_bytes": peak_bytes,
+            "allocated_blocks": blocks
+        }
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Describe every benchmark that regressed past ``threshold`` (a fraction)"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        slowdown = 1 - result["ops_per_sec"] / reference["ops_per_sec"]
+        if slowdown > threshold:
+            regressions.append(f"{name}: {result['ops_per_sec']:.0f} ops/s vs baseline "
+                               f"{reference['ops_per_sec']:.0f} ({slowdown:.0%} slower)")
+        growth = result["peak_bytes"] / max(1, reference["peak_bytes"]) - 1
+        if growth > threshold and result["peak_bytes"] - reference["peak_bytes"] > 1024:
+            regressions.append(f"{name}: peak {result['peak_bytes']} bytes vs baseline "
+                               f"{reference['peak_bytes']} ({growth:.0%} more)")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict], baseline: Dict[str, Dict]):
+    print(f"{'benchmark':<48} {'ops/sec':>12} {'vs base':>8} {'peak KiB':>9} {'blocks':>7}")
+    print("-" * 88)
+    for name, result in results.items():
+        reference = baseline.get(name)
+        change = f"{result['ops_per_sec'] / reference['ops_per_sec'] - 1:+.0%}" if reference else "new"
+        print(f"{name:<48} {result['ops_per_sec']:>12,.0f} {change:>8} "
+              f"{result['peak_bytes'] / 1024:>9.1f} {result['allocated_blocks']:>7}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation hot path")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed regression as a fraction (default 0.25 = 25%%)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing repeat")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--update-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--json", type=Path, help="Also write results to this file")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = run_benchmarks(args.filter, args.min_time, args.repeats)
+    print_table(results, baseline)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.update_baseline:
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"\n✅ Baseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) past {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Compact, indexed jewelry catalog.
+
+``sample_data.json`` is loaded once into immutable tables: every stone,
+shape, metal, setting, clarity grade and color is interned to a small
+integer code, with its numeric attributes held in read-only NumPy columns
+and in plain dicts for scalar lookups on the hot path.
+
+The catalog can also be compiled to a binary snapshot whose numeric
+columns are memory-mapped at startup, so workers share them through the
+page cache instead of each parsing JSON:
+
+    python catalog.py sample_data.json catalog.bin
+
+CatalogWatcher reloads the catalog when its source file changes. Each
+reload builds and validates a new immutable snapshot off the request path
+and publishes it with a single reference assignment, so readers never
+take a lock and a request keeps whichever snapshot it read first.
+"""
+
+import argparse
+import hashlib
+import logging
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Generic, Iterator, Mapping, Optional, Tuple, TypeVar
+
+import numpy as np
+import orjson
+
+DEFAULT_SOURCE = Path(__file__).with_name("sample_data.json")
+
+SNAPSHOT_MAGIC = b"LUMCAT01"
+
+logger = logging.getLogger(__name__)
+
+# Table -> numeric columns read from each entry (missing values become NaN)
+TABLE_COLUMNS = {
+    "stones": ("price_per_carat", "hardness"),
+    "shapes": ("price_premium",),
+    "metals": ("price_per_gram",),
+    "settings": ("price_multiplier",),
+}
+
+
+class AttributeTable:
+    """Interned names with numeric columns, indexed by integer code"""
+
+    def __init__(self, names: Tuple[str, ...], columns: Dict[str, np.ndarray]):
+        self.names = tuple(sys.intern(name) for name in names)
+        self.codes: Mapping[str, int] = MappingProxyType({name: i for i, name in enumerate(self.names)})
+        for column in columns.values():
+            column.flags.writeable = False
+        self.columns: Mapping[str, np.ndarray] = MappingProxyType(columns)
+        # Scalar lookups avoid NumPy scalar arithmetic in per-design pricing
+        self._lookup = {
+            column: dict(zip(self.names, values.tolist())) for column, values in columns.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.codes
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def code(self, name: str) -> Optional[int]:
+        return self.codes.get(name)
+
+    def value(self, column: str, name: str, default: float = None) -> float:
+        return self._lookup[column].get(name, default)
+
+    def lookup(self, column: str) -> Mapping[str, float]:
+        return MappingProxyType(self._lookup[column])
+
+
+@dataclass(frozen=True)
+class Catalog:
+    stones: AttributeTable
+    shapes: AttributeTable
+    metals: AttributeTable
+    settings: AttributeTable
+    clarity: AttributeTable       # stone_quality_multipliers
+    colors: AttributeTable        # color_multipliers
+    size_premiums: AttributeTable  # carat thresholds, as strings, with premiums
+    ring_types: Tuple[str, ...]
+    details: Mapping[str, Any]    # Descriptive, non-numeric source data
+    version: str
+
+    def __post_init__(self):
+        diamond = self.stones.value("price_per_carat", "diamond") or 1.0
+        object.__setattr__(self, "_stone_factors", {
+            name: price / diamond for name, price in self.stones.lookup("price_per_carat").items()
+        })
+
+    def stone_price_factor(self, stone_type: str) -> float:
+        """Per-carat price of a stone relative to a diamond"""
+        return self._stone_factors.get(stone_type, 1.0)
+
+    def stone_price_factors(self) -> np.ndarray:
+        """``stone_price_factor`` for every stone, by code"""
+        return np.array([self._stone_factors[name] for name in self.stones.names], dtype=np.float64)
+
+
+def _table(entries: Mapping[str, Mapping[str, Any]], columns: Tuple[str, ...]) -> AttributeTable:
+    names = tuple(entries)
+    return AttributeTable(names, {
+        column: np.array([float(entries[name].get(column, np.nan)) for name in names], dtype=np.float64)
+        for column in columns
+    })
+
+
+def _multipliers(values: Mapping[str, float], column: str = "multiplier") -> AttributeTable:
+    return AttributeTable(tuple(values), {column: np.array(list(values.values()), dtype=np.float64)})
+
+
+def parse_catalog(raw: bytes) -> Catalog:
+    data = orjson.loads(raw)
+    database = data["jewelry_database"]
+    factors = data.get("price_factors", {})
+
+    tables = {table: _table(database.get(table, {}), columns) for table, columns in TABLE_COLUMNS.items()}
+    details = {
+        table: {name: {k: v for k, v in entry.items() if k not in TABLE_COLUMNS.get(table, ())}
+                for name, entry in entries.items()}
+        for table, entries in database.items() if table != "ring_types"
+    }
+    return Catalog(
+        **tables,
+        clarity=_multipliers(factors.get("stone_quality_multipliers", {})),
+        colors=_multipliers(factors.get("color_multipliers", {})),
+        size_premiums=_multipliers(factors.get("size_premiums", {}), "premium"),
+        ring_types=tuple(sys.intern(name) for name in database.get("ring_types", {})),
+        details=MappingProxyType(details),
+        version=hashlib.sha256(raw).hexdigest()[:12]
+    )
+
+
+def _tables(catalog: Catalog) -> Dict[str, AttributeTable]:
+    return {
+        name: getattr(catalog, name)
+        for name in ("stones", "shapes", "metals", "settings", "clarity", "colors", "size_premiums")
+    }
+
+
+def write_snapshot(catalog: Catalog, path: Path):
+    """Write a snapshot: magic, header length, JSON header, then float64 columns.
+
+    Written to a temporary file and renamed, so workers never map a
+    partial snapshot.
+    """
+    layout = {}
+    blocks = []
+    offset = 0
+    for name, table in _tables(catalog).items():
+        columns = {}
+        for column, values in table.columns.items():
+            columns[column] = [offset, len(values)]
+            blocks.append(np.ascontiguousarray(values, dtype="<f8"))
+            offset += len(values)
+        layout[name] = {"names": list(table.names), "columns": columns}
+
+    header = orjson.dumps({
+        "tables": layout,
+        "ring_types": list(catalog.ring_types),
+        "details": catalog.details,
+        "version": catalog.version
+    }, default=dict)
+    # Pad so the float64 block starts 8-byte aligned
+    header += b" " * (-(len(SNAPSHOT_MAGIC) + 8 + len(header)) % 8)
+
+    path = Path(path)
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for block in blocks:
+            f.write(block.tobytes())
+    temporary.replace(path)
+
+
+def load_snapshot(path: Path) -> Catalog:
+    """Load a snapshot, memory-mapping its numeric columns read-only"""
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        (header_length,) = struct.unpack("<Q", f.read(8))
+        header = orjson.loads(f.read(header_length))
+
+    data_offset = len(SNAPSHOT_MAGIC) + 8 + header_length
+    size = sum(length for table in header["tables"].values() for _, length in table["columns"].values())
+    data = np.memmap(path, dtype="<f8", mode="r", offset=data_offset, shape=(size,)) if size else np.empty(0)
+
+    tables = {
+        name: AttributeTable(tuple(layout["names"]), {
+            column: data[start:start + length] for column, (start, length) in layout["columns"].items()
+        })
+        for name, layout in header["tables"].items()
+    }
+    return Catalog(
+        **tables,
+        ring_types=tuple(sys.intern(name) for name in header["ring_types"]),
+        details=MappingProxyType(header["details"]),
+        version=header["version"]
+    )
+
+
+def load_catalog(source: Path = DEFAULT_SOURCE, snapshot: Optional[Path] = None) -> Catalog:
+    """Load from ``snapshot`` when it exists and is not older than ``source``"""
+    source = Path(source)
+    if snapshot is not None:
+        snapshot = Path(snapshot)
+        if snapshot.exists() and (not source.exists() or snapshot.stat().st_mtime >= source.stat().st_mtime):
+            return load_snapshot(snapshot)
+    return parse_catalog(source.read_bytes())
+
+
+def validate_catalog(catalog: Catalog):
+    """Raise ValueError if the catalog cannot be priced"""
+    if "diamond" not in catalog.stones:
+        raise ValueError("Catalog must include diamond; stone prices are relative to it")
+    for table, column, minimum in (("stones", "price_per_carat", 0.0), ("shapes", "price_premium", 0.0),
+                                   ("metals", "price_per_gram", 0.0), ("settings", "price_multiplier", 0.0)):
+        entries: AttributeTable = getattr(catalog, table)
+        if table in ("shapes", "metals") and not len(entries):
+            raise ValueError(f"Catalog has no {table}")
+        for name, value in entries.lookup(column).items():
+            if not math.isfinite(value) or value < minimum or (value == 0 and table != "metals"):
+                raise ValueError(f"Invalid {column} for {table[:-1]} {name!r}: {value}")
+
+
+Built = TypeVar("Built")
+
+
+class CatalogVersionUnavailable(LookupError):
+    """A requested catalog version is no longer held and is not what the source holds"""
+
+    def __init__(self, version: str):
+        super().__init__(version)
+        self.version = version
+
+    def __str__(self) -> str:
+        return f"Catalog version {self.version} is no longer available"
+
+
+class CatalogWatcher(Generic[Built]):
+    """Watches the catalog source and swaps in rebuilt snapshots.
+
+    ``build(catalog)`` derives everything that depends on the catalog (for
+    example a priced design space) and must return an object with a
+    ``version`` attribute. ``current`` is replaced wholesale on each
+    reload; the few previous snapshots stay reachable by version so work
+    that started on one can finish on it.
+    """
+
+    def __init__(self, build: Callable[[Catalog], Built], source: Path = DEFAULT_SOURCE,
+                 snapshot: Optional[Path] = None, interval: float = 2.0, history: int = 4):
+        self.build = build
+        self.source = Path(source)
+        self.snapshot = snapshot
+        self.interval = interval
+        self.history = history
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._stamp = self._source_stamp()
+        catalog = load_catalog(self.source, self.snapshot)
+        validate_catalog(catalog)
+        self.current: Built = build(catalog)
+        self.loaded_at = time.time()
+        self._by_version: Dict[str, Built] = {self.current.version: self.current}
+        # Versions not found, with the source stamp at the time, so each is re-read for at most once per change
+        self._missing: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    def _source_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.source)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, version: Optional[str] = None) -> Built:
+        """Snapshot ``version``, or the current one.
+
+        A process that has not seen ``version`` yet (a pool worker whose
+        parent already reloaded) reloads from disk first. A version that is
+        still not found raises CatalogVersionUnavailable; the source is not
+        read again for it until the file changes.
+        """
+        current = self.current
+        if version is None or current.version == version:
+            return current
+        built = self._by_version.get(version)
+        if built is None:
+            stamp = self._source_stamp()
+            if version not in self._missing or self._missing[version] != stamp:
+                self.reload()
+                built = self._by_version.get(version)
+                if built is None:
+                    if version not in self._missing:
+                        logger.warning("Catalog version %s was requested but is no longer available "
+                                       "(current is %s)", version, self.current.version)
+                    self._missing[version] = stamp
+                    while len(self._missing) > self.history * 4:
+                        del self._missing[next(iter(self._missing))]
+            if built is None:
+                raise CatalogVersionUnavailable(version)
+        return built
+
+    def reload(self) -> bool:
+        """Rebuild from the source file; returns whether a new snapshot was published"""
+        with self._reload_lock:
+            self._stamp = self._source_stamp()
+            try:
+                catalog = parse_catalog(self.source.read_bytes())
+                if catalog.version == self.current.version:
+                    return False
+                validate_catalog(catalog)
+                built = self.build(catalog)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning("Catalog reload from %s failed, keeping version %s: %s",
+                               self.source, self.current.version, self.last_error)
+                return False
+
+            # Copy-on-write: readers see either the old or the new mapping, never a partial one
+            by_version = {version: b for version, b in self._by_version.items() if version != built.version}
+            by_version[built.version] = built
+            while len(by_version) > self.history:
+                del by_version[next(iter(by_version))]
+            self._by_version = by_version
+            self.current = built
+            self.loaded_at = time.time()
+            self.reloads += 1
+            self.last_error = None
+            return True
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="catalog-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            if self._source_stamp() != self._stamp:
+                self.reload()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.current.version,
+            "source": str(self.source),
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "watching": self._thread is not None
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile sample_data.json into a memory-mappable snapshot")
+    parser.add_argument("source", type=Path, nargs="?", default=DEFAULT_SOURCE)
+    parser.add_argument("snapshot", type=Path, nargs="?", default=Path("catalog.bin"))
+    args = parser.parse_args()
+
+    catalog = parse_catalog(args.source.read_bytes())
+    write_snapshot(catalog, args.snapshot)
+    counts = ", ".join(f"{len(table)} {name}" for name, table in _tables(catalog).items())
+    print(f"Wrote {args.snapshot} (version {catalog.version}): {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget for a worker.
+
+Reports what ``import main`` spends in each top-level package, from
+``python -X importtime``, then launches a fresh server process and times
+it to its first successful recommendation and to readiness. Exits
+non-zero when the first recommendation takes longer than the budget.
+
+    python coldstart.py
+    python coldstart.py --budget 2.5 --top 20
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Callable, Dict
+
+# Launch to first successful recommendation, in seconds
+COLD_START_BUDGET_SECONDS = float(os.environ.get("LUMIERE_COLD_START_BUDGET_SECONDS", "3.0"))
+
+
+def import_costs(module: str = "main") -> Dict:
+    """Self import time per top-level package, and the total for ``module``"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    packages: Dict[str, Dict] = defaultdict(lambda: {"self_ms": 0.0, "modules": 0})
+    total_ms = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (field.strip() for field in line[len("import time:"):].split("|"))
+        package = packages[name.split(".")[0]]
+        package["self_ms"] += int(self_us) / 1000
+        package["modules"] += 1
+        if name == module:
+            total_ms = int(cumulative_us) / 1000
+    ranked = sorted(({"package": name, **costs} for name, costs in packages.items()),
+                    key=lambda entry: entry["self_ms"], reverse=True)
+    return {"module": module, "total_ms": total_ms, "packages": ranked}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(check: Callable[[], bool], started: float, timeout: float) -> float:
+    """Seconds from ``started`` until ``check`` passes"""
+    while time.perf_counter() - started < timeout:
+        try:
+            if check():
+                return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"Server did not respond within {timeout:.0f}s")
+
+
+def measure_cold_start(port: int = 0, timeout: float = 30.0) -> Dict[str, float]:
+    """Launch ``uvicorn main:app`` and time it to its first recommendation and to readiness"""
+    port = port or free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    def recommend() -> bool:
+        request = urllib.request.Request(f"{base_url}/api/preferences", data=json.dumps({}).encode(),
+                                         headers={"content-type": "application/json"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status == 200
+
+    def ready() -> bool:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/health/ready", timeout=5) as response:
+                return response.status == 200
+        except urllib.error.HTTPError:
+            return False
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        first_request = wait_until(recommend, started, timeout)
+        ready_seconds = wait_until(ready, started, timeout)
+    finally:
+        process.terminate()
+        process.wait()
+    return {"first_request_seconds": first_request, "ready_seconds": ready_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report and cold-start budget check")
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET_SECONDS,
+                        help="Seconds allowed from launch to the first successful recommendation")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    parser.add_argument("--module", default="main")
+    args = parser.parse_args()
+
+    costs = import_costs(args.module)
+    print(f"{'package':<28}{'self ms':>10}{'share':>8}{'modules':>9}")
+    print("-" * 55)
+    for entry in costs["packages"][:args.top]:
+        share = entry["self_ms"] / costs["total_ms"] if costs["total_ms"] else 0.0
+        print(f"{entry['package']:<28}{entry['self_ms']:>10.1f}{share:>8.0%}{entry['modules']:>9}")
+    print(f"\nimport {args.module}: {costs['total_ms']:.0f} ms")
+
+    result = measure_cold_start()
+    print(f"launch to first recommendation: {result['first_request_seconds']:.2f}s (budget {args.budget:.2f}s)")
+    print(f"launch to ready: {result['ready_seconds']:.2f}s")
+
+    if result["first_request_seconds"] > args.budget:
+        print("\n❌ Cold start over budget")
+        sys.exit(1)
+    print("\n✅ Cold start within budget")
+
+
+if __name__ == "__main__":
+    main()
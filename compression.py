@@ -0,0 +1,181 @@
+"""
+Response compression for the JSON API.
+
+Complete responses at least ``minimum_size`` bytes long are compressed in
+one call. Streamed responses (NDJSON batches, server-sent events) are
+compressed chunk by chunk, and every chunk is flushed, so a client
+receives each line or event as soon as it is produced instead of when the
+compressor's window fills.
+
+The encoding is negotiated from ``Accept-Encoding``: brotli when the
+optional ``brotli`` package is installed and the client accepts it,
+otherwise gzip. Every compressed response records its ratio and the CPU
+time spent compressing it, so the levels can be tuned from real traffic.
+"""
+
+import time
+import zlib
+from typing import Iterable, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from metrics import REGISTRY
+from static_assets import brotli, choose_encoding
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/event-stream", "text/")
+
+RATIO_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0)
+CPU_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+COMPRESSION_RESPONSES = REGISTRY.counter(
+    "lumiere_compression_responses_total", "API responses by compression outcome", ("encoding", "outcome")
+)
+COMPRESSION_BYTES = REGISTRY.counter(
+    "lumiere_compression_bytes_total", "Body bytes before (in) and after (out) compression",
+    ("encoding", "direction")
+)
+COMPRESSION_RATIO = REGISTRY.histogram(
+    "lumiere_compression_ratio", "Compressed size over original size per response", ("encoding", "mode"),
+    buckets=RATIO_BUCKETS
+)
+COMPRESSION_CPU_SECONDS = REGISTRY.histogram(
+    "lumiere_compression_cpu_seconds", "CPU time spent compressing each response", ("encoding", "mode"),
+    buckets=CPU_BUCKETS
+)
+
+
+class GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing API responses for clients that accept it.
+
+    Responses that already carry a ``Content-Encoding``, are not text or
+    JSON, or belong to paths outside ``prefixes`` pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4,
+                 prefixes: Iterable[str] = ("/api/",)):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.prefixes = tuple(prefixes)
+        self.encodings: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def stream(self, encoding: str):
+        return BrotliStream(self.brotli_quality) if encoding == "br" else GzipStream(self.gzip_level)
+
+    def compress(self, encoding: str, data: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)
+        return zlib.compress(data, self.gzip_level, wbits=31)
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] == "HEAD"
+                or not scope["path"].startswith(self.prefixes)):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"), self.encodings)
+        if encoding not in self.encodings:
+            COMPRESSION_RESPONSES.inc("identity", "not_accepted")
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        # None until the first body chunk decides between passthrough, buffered and streamed
+        compressor = None
+        passthrough = False
+        original_bytes = compressed_bytes = 0
+        cpu_seconds = 0.0
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough, original_bytes, compressed_bytes, cpu_seconds
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if ("content-encoding" in headers or message["status"] in (204, 304)
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                    passthrough = True
+                    COMPRESSION_RESPONSES.inc("identity", "not_compressible")
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None and not more_body:
+                # The whole body is here: compress it in one call, or skip it if too small
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if len(body) < self.minimum_size:
+                    COMPRESSION_RESPONSES.inc("identity", "below_minimum")
+                    await send(start_message)
+                    await send(message)
+                    return
+                started = time.thread_time()
+                compressed = self.compress(encoding, body)
+                self._observe(encoding, "buffered", len(body), len(compressed), time.thread_time() - started)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": compressed})
+                return
+
+            if compressor is None:
+                # Streamed body: length unknown, so compress and flush each chunk as it arrives
+                compressor = self.stream(encoding)
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                headers["Content-Encoding"] = encoding
+                if "content-length" in headers:
+                    del headers["content-length"]
+                await send(start_message)
+
+            started = time.thread_time()
+            chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.finish()
+            cpu_seconds += time.thread_time() - started
+            original_bytes += len(body)
+            compressed_bytes += len(chunk)
+            if not more_body:
+                self._observe(encoding, "streamed", original_bytes, compressed_bytes, cpu_seconds)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _observe(encoding: str, mode: str, original: int, compressed: int, cpu_seconds: float):
+        COMPRESSION_RESPONSES.inc(encoding, mode)
+        COMPRESSION_BYTES.inc(encoding, "in", amount=original)
+        COMPRESSION_BYTES.inc(encoding, "out", amount=compressed)
+        if original:
+            COMPRESSION_RATIO.observe(compressed / original, encoding, mode)
+        COMPRESSION_CPU_SECONDS.observe(cpu_seconds, encoding, mode)
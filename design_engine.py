@@ -0,0 +1,155 @@
+"""
+Vectorized design-space engine.
+
+Every stone x shape x metal x carat candidate is priced once, as NumPy
+arrays, with the same formula ``calculate_premium_price`` uses. The space
+is laid out stone-major with the carat grid innermost, so each
+(stone, shape, metal) combination owns a contiguous block of prices and a
+request only ever touches the blocks it asks for. Budget fitting is then
+a boolean mask over those blocks instead of a repair loop.
+"""
+
+from typing import Callable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from catalog import Catalog
+
+CARAT_MIN = 0.5
+CARAT_MAX = 3.0
+CARAT_STEP = 0.01
+
+
+class DesignCandidate(NamedTuple):
+    stone_type: str
+    stone_shape: str
+    metal_type: str
+    carat_weight: float
+    estimated_price: float
+
+
+class DesignSpaceEngine:
+    """Priced candidate space over a catalog's stones, shapes and metals.
+
+    ``price_formula(shape_premium, carat_weight, metal_price_per_gram,
+    stone_factor=...)`` must accept NumPy arrays and broadcast. Metals
+    requested by name but missing from the catalog are priced at
+    ``default_metal_price``, matching the scalar pricing fallback.
+    """
+
+    def __init__(self, catalog: Catalog, price_formula: Callable,
+                 default_metal_price: float = 50, carat_grid: Sequence[float] = None):
+        if carat_grid is None:
+            steps = int(round((CARAT_MAX - CARAT_MIN) / CARAT_STEP)) + 1
+            carat_grid = np.round(np.linspace(CARAT_MIN, CARAT_MAX, steps), 2)
+
+        self.stones = catalog.stones.names
+        self.shapes = catalog.shapes.names
+        # The trailing metal slot prices any metal we have no data for
+        self.metals = catalog.metals.names + (None,)
+        self.stone_codes = catalog.stones.codes
+        self.shape_codes = catalog.shapes.codes
+        self.metal_codes = catalog.metals.codes
+        self.carats = np.asarray(carat_grid, dtype=np.float64)
+
+        stone_factor = catalog.stone_price_factors()
+        premiums = np.asarray(catalog.shapes.columns["price_premium"])
+        per_gram = np.append(catalog.metals.columns["price_per_gram"], default_metal_price)
+
+        self.shape = (len(self.stones), len(self.shapes), len(self.metals), len(self.carats))
+        prices = price_formula(
+            premiums[None, :, None, None], self.carats[None, None, None, :], per_gram[None, None, :, None],
+            stone_factor=stone_factor[:, None, None, None]
+        )
+        self.price = np.round(np.broadcast_to(prices, self.shape), 2).ravel()
+        self.price.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def _block_starts(self, stones: Sequence[str], shapes: Sequence[str], metals: Sequence[str]) -> np.ndarray:
+        """Sorted offsets of the carat blocks for every requested combination"""
+        stone_codes = sorted({self.stone_codes[s] for s in stones if s in self.stone_codes})
+        shape_codes = sorted({self.shape_codes[s] for s in shapes if s in self.shape_codes})
+        metal_codes = sorted({self.metal_codes[m] for m in metals if m in self.metal_codes})
+        if any(m not in self.metal_codes for m in metals):
+            metal_codes.append(len(self.metals) - 1)
+
+        _, n_shapes, n_metals, n_carats = self.shape
+        combos = ((np.array(stone_codes, dtype=np.intp)[:, None, None] * n_shapes
+                   + np.array(shape_codes, dtype=np.intp)[None, :, None]) * n_metals
+                  + np.array(metal_codes, dtype=np.intp)[None, None, :])
+        return combos.ravel() * n_carats
+
+    def _expand(self, starts: np.ndarray, first: int, last: int) -> np.ndarray:
+        return (starts[:, None] + np.arange(first, last)).ravel()
+
+    def select(self, stones: Sequence[str], shapes: Sequence[str], metals: Sequence[str],
+               carat_range: Tuple[float, float],
+               budget: Tuple[float, float]) -> Tuple[np.ndarray, bool]:
+        """Indices of the best-fitting candidates and whether they are ranked.
+
+        Tiers relax in order: carat range and budget window, carat range
+        under the budget ceiling, anything under the ceiling (most
+        expensive first), and finally the cheapest candidates when nothing
+        fits at all. The first two tiers are unordered pools to sample from.
+        """
+        budget_min, budget_max = budget
+        starts = self._block_starts(stones, shapes, metals)
+
+        first = int(np.searchsorted(self.carats, carat_range[0], side="left"))
+        last = int(np.searchsorted(self.carats, carat_range[1], side="right"))
+        in_range = self._expand(starts, first, last)
+        prices = self.price[in_range]
+        affordable = prices <= budget_max
+
+        for mask in (affordable & (prices >= budget_min), affordable):
+            indices = in_range[mask]
+            if len(indices):
+                return indices, False
+
+        everything = self._expand(starts, 0, len(self.carats))
+        prices = self.price[everything]
+        indices = everything[prices <= budget_max]
+        if len(indices):
+            return indices[np.argsort(-self.price[indices], kind="stable")], True
+
+        return everything[np.argsort(prices, kind="stable")], True
+
+    def sample(self, rng, stones: Sequence[str], shapes: Sequence[str], metals: Sequence[str],
+               carat_range: Tuple[float, float], budget: Tuple[float, float],
+               k: int = 1) -> List[DesignCandidate]:
+        """Draw ``k`` candidates that fit the request.
+
+        ``rng`` is a ``random.Random`` (or the ``random`` module) so callers
+        control reproducibility. Ranked fallback tiers return their top
+        entries instead of a random draw, and picks repeat only when the
+        pool is smaller than ``k``. A stone or shape filter naming nothing
+        in the catalog (after a reload, say) is dropped rather than
+        returning no candidates.
+        """
+        indices, ranked = self.select(stones, shapes, metals, carat_range, budget)
+        if len(indices) == 0:
+            stones = [s for s in stones if s in self.stone_codes] or self.stones
+            shapes = [s for s in shapes if s in self.shape_codes] or self.shapes
+            metals = metals or self.metals[:-1]
+            indices, ranked = self.select(stones, shapes, metals, carat_range, budget)
+
+        pool = min(k, len(indices))
+        picks = list(range(pool)) if ranked else rng.sample(range(len(indices)), pool)
+        picks += [picks[i % pool] for i in range(k - pool)]
+
+        unknown_metal = next((m for m in metals if m not in self.metal_codes), None)
+        return [self.candidate(int(indices[p]), unknown_metal) for p in picks]
+
+    def candidate(self, index: int, metal_name: str = None) -> DesignCandidate:
+        """Materialize one candidate; ``metal_name`` labels the fallback metal slot"""
+        stone, shape, metal, carat = np.unravel_index(index, self.shape)
+        metal_type = self.metals[metal]
+        return DesignCandidate(
+            stone_type=self.stones[stone],
+            stone_shape=self.shapes[shape],
+            metal_type=metal_type if metal_type is not None else metal_name,
+            carat_weight=float(self.carats[carat]),
+            estimated_price=float(self.price[index])
+        )
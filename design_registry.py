@@ -0,0 +1,114 @@
+"""
+Registry of served designs.
+
+Generated designs are identified by a digest of their canonical
+attributes, so the same stone, cut, grades, metal, setting and price
+always get the same ID, on every worker and across restarts, and two
+different designs never share one. Inventory designs keep their SKU.
+
+Each design is stored once however many sessions it was shown to, with
+its strings interned. Only the attributes that make up the ID are kept
+here. Rationale, story connection, features and tags are written for one
+customer's story, so they stay with that customer's session.
+
+The registry is per process. Anything that must survive a restart or be
+seen by other workers, such as a shortlist, is copied into the session.
+"""
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import orjson
+
+# Attributes that make two designs the same piece at the same price
+DESIGN_KEY_FIELDS = (
+    "stone_type", "stone_shape", "stone_color", "stone_clarity",
+    "carat_weight", "metal_type", "setting_type", "estimated_price"
+)
+
+# What the registry holds for each design; everything else is per session
+DESIGN_ATTRIBUTE_FIELDS = ("id",) + DESIGN_KEY_FIELDS
+
+
+def design_key(design: Dict[str, Any]) -> str:
+    """Stable ID for a generated design, derived from its canonical attributes"""
+    canonical = orjson.dumps([design[field] for field in DESIGN_KEY_FIELDS])
+    return "lumiere_" + hashlib.blake2b(canonical, digest_size=12).hexdigest()
+
+
+def design_attributes(design: Dict[str, Any]) -> Dict[str, Any]:
+    """The story-independent part of a served design"""
+    return {field: design[field] for field in DESIGN_ATTRIBUTE_FIELDS}
+
+
+def intern_strings(value: Any) -> Any:
+    """Copy of a JSON-like value with every string interned"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return {sys.intern(key): intern_strings(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [intern_strings(item) for item in value]
+    return value
+
+
+class DesignRegistry:
+    """Thread-safe LRU store of served design attributes keyed by design ID.
+
+    A design registered again is only marked as recently used; its
+    attributes are the same by construction of the ID.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._designs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.registrations = 0
+        self.duplicates = 0
+        self.evictions = 0
+
+    def register(self, designs: Iterable[Dict[str, Any]]) -> List[str]:
+        """Store designs not seen before; returns their IDs in order"""
+        ids = []
+        with self._lock:
+            for design in designs:
+                design_id = design["id"]
+                ids.append(design_id)
+                self.registrations += 1
+                if design_id in self._designs:
+                    self._designs.move_to_end(design_id)
+                    self.duplicates += 1
+                    continue
+                self._designs[design_id] = intern_strings(design_attributes(design))
+            while len(self._designs) > self.max_entries:
+                self._designs.popitem(last=False)
+                self.evictions += 1
+        return ids
+
+    def get(self, design_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._designs.get(design_id)
+
+    def resolve(self, design_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Attributes for whichever of ``design_ids`` are still held"""
+        with self._lock:
+            designs = ((design_id, self._designs.get(design_id)) for design_id in design_ids)
+            return {design_id: design for design_id, design in designs if design is not None}
+
+    def __contains__(self, design_id: str) -> bool:
+        return design_id in self._designs
+
+    def __len__(self) -> int:
+        return len(self._designs)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._designs),
+                "registrations": self.registrations,
+                "duplicates": self.duplicates,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,173 @@
+"""
+Bounded execution layer for CPU-bound request work.
+
+Route handlers hand the recommendation pipeline to a thread or process
+pool instead of running it on the event loop. In-flight work is capped
+and the wait queue is bounded, so bursts are shed quickly with a
+retryable error instead of stalling every connection on the worker.
+"""
+
+import asyncio
+import contextvars
+import math
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+_EXHAUSTED = object()
+
+
+class ExecutorSaturated(Exception):
+    """Raised when work cannot be admitted; maps to a 429 or 503 response"""
+
+    def __init__(self, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class BoundedExecutor:
+    """Run callables on a pool with at most ``max_in_flight`` running.
+
+    Up to ``max_queue`` further callers wait for a slot; beyond that they
+    are rejected at once with 429. Callers that wait longer than
+    ``queue_timeout`` are rejected with 503.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: Optional[int] = None,
+                 max_in_flight: Optional[int] = None, max_queue: int = 64,
+                 queue_timeout: float = 2.0):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or max_workers or 4
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._pool: Optional[Executor] = None
+        self._stream_pool: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            pool_class = ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+            self._pool = pool_class(max_workers=self.max_workers)
+        return self._pool
+
+    @property
+    def stream_pool(self) -> Executor:
+        """Threads for streamed work; generators cannot be sent to another process"""
+        if self.kind == "thread":
+            return self.pool
+        if self._stream_pool is None:
+            self._stream_pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        return self._stream_pool
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        average_run = self.total_run_seconds / self.completed if self.completed else 1.0
+        backlog = (self.queue_depth + self.in_flight) / self.max_in_flight
+        return max(1, math.ceil(average_run * backlog))
+
+    async def _admit(self) -> float:
+        """Wait for a slot; returns when the work started"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+
+        queued_at = time.perf_counter()
+        if not self._slots.locked():
+            # A free slot is taken without suspending
+            await self._slots.acquire()
+        else:
+            if self.queue_depth >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated(429, self.retry_after(), "Server is busy, please retry shortly")
+
+            self.queue_depth += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise ExecutorSaturated(503, self.retry_after(), "Server is overloaded, please retry shortly")
+            finally:
+                self.queue_depth -= 1
+
+        started_at = time.perf_counter()
+        waited = started_at - queued_at
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        self.in_flight += 1
+        return started_at
+
+    def _release(self, started_at: float):
+        self.in_flight -= 1
+        self.completed += 1
+        self.total_run_seconds += time.perf_counter() - started_at
+        self._slots.release()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        started_at = await self._admit()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, partial(func, *args, **kwargs))
+        finally:
+            self._release(started_at)
+
+    async def stream(self, func: Callable, *args, context: Optional[contextvars.Context] = None,
+                     **kwargs) -> AsyncIterator:
+        """Run the generator function ``func`` and yield its items as they are produced.
+
+        Admission is the same as for ``run``, and happens when the first
+        item is requested. Each item is produced on a thread, inside
+        ``context`` (a copy of the caller's by default). The slot is held
+        until the generator is exhausted or the stream is closed.
+        """
+        started_at = await self._admit()
+        try:
+            loop = asyncio.get_running_loop()
+            context = context or contextvars.copy_context()
+            iterator = func(*args, **kwargs)
+            while True:
+                item = await loop.run_in_executor(self.stream_pool, context.run, next, iterator, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    return
+                yield item
+        finally:
+            self._release(started_at)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._stream_pool is not None:
+            self._stream_pool.shutdown(wait=False, cancel_futures=True)
+            self._stream_pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self.completed + self.in_flight
+        return {
+            "kind": self.kind,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "average_wait_seconds": self.total_wait_seconds / admitted if admitted else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+            "average_run_seconds": self.total_run_seconds / self.completed if self.completed else 0.0
+        }
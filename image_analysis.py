@@ -0,0 +1,139 @@
+"""
+Image style extraction for visual inspiration uploads.
+
+Images are decoded in draft mode and downscaled before any analysis, then
+summarized into a handful of color and texture features that are mapped
+onto the recommender's style vocabulary. Pillow is imported on first use,
+so only the processes that analyze images load it.
+
+Images larger than ``MAX_IMAGE_PIXELS`` are refused from their header,
+before anything is decoded, so one upload cannot hold a worker for long.
+"""
+
+import os
+import warnings
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Dict, List
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+STYLES = ["vintage", "modern", "romantic", "minimalist", "bohemian"]
+
+ANALYSIS_SIZE = 128
+PALETTE_COLORS = 5
+EDGE_THRESHOLD = 40
+
+MAX_IMAGE_PIXELS = int(os.environ.get("LUMIERE_IMAGE_MAX_PIXELS", str(24_000_000)))
+
+
+class ImageTooLarge(ValueError):
+    """The upload's dimensions exceed ``MAX_IMAGE_PIXELS``"""
+
+
+def preload():
+    """Import Pillow and its common decoders ahead of the first upload"""
+    from PIL import Image, ImageFilter, ImageStat  # noqa: F401
+    Image.preinit()
+
+
+def load_thumbnail(data: bytes, size: int = ANALYSIS_SIZE) -> "Image.Image":
+    """Decode an image at (roughly) thumbnail resolution"""
+    from PIL import Image
+
+    # Opening reads only the header, so the size is known before decoding.
+    # Pillow's own decompression-bomb guard is looser than ours: its warning
+    # is redundant and its error is just another oversized image.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            image = Image.open(BytesIO(data))
+        except Image.DecompressionBombError as e:
+            raise ImageTooLarge(str(e)) from e
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"{image.width}x{image.height} exceeds {MAX_IMAGE_PIXELS} pixels")
+    # JPEG decoders can downscale by 1/2..1/8 while decoding
+    image.draft("RGB", (size, size))
+    image = image.convert("RGB")
+    image.thumbnail((size, size))
+    return image
+
+
+def extract_image_features(image: "Image.Image") -> Dict[str, Any]:
+    """Summarize palette, warmth, saturation, brightness and edge density"""
+    from PIL import ImageFilter, ImageStat
+
+    pixel_count = image.width * image.height
+
+    quantized = image.quantize(colors=PALETTE_COLORS)
+    palette = quantized.getpalette()
+    palette_counts = sorted(quantized.getcolors(), reverse=True)
+    dominant_colors = [
+        {
+            "hex": "#{:02x}{:02x}{:02x}".format(*palette[index * 3:index * 3 + 3]),
+            "share": round(count / pixel_count, 3)
+        }
+        for count, index in palette_counts
+    ]
+
+    red, green, blue = ImageStat.Stat(image).mean
+    _, saturation, value = ImageStat.Stat(image.convert("HSV")).mean
+
+    edges = image.convert("L").filter(ImageFilter.FIND_EDGES).histogram()
+    edge_density = sum(edges[EDGE_THRESHOLD:]) / pixel_count
+
+    return {
+        "dominant_colors": dominant_colors,
+        "warmth": round((red - blue) / 255, 3),
+        "pinkness": round((red + blue) / 2 / 255 - green / 255, 3),
+        "saturation": round(saturation / 255, 3),
+        "brightness": round(value / 255, 3),
+        "edge_density": round(edge_density, 3),
+        "color_spread": round(1 - dominant_colors[0]["share"], 3)
+    }
+
+
+def clamp(value: float) -> float:
+    return max(0.0, min(1.0, value))
+
+
+def score_styles(features: Dict[str, Any]) -> Dict[str, float]:
+    """Map image features onto the style vocabulary, each score in [0, 1]"""
+    warmth = features["warmth"]
+    saturation = features["saturation"]
+    brightness = features["brightness"]
+    edges = features["edge_density"]
+    spread = features["color_spread"]
+
+    return {
+        # Warm, muted, mid-tone: sepia and antique gold
+        "vintage": clamp(0.5 + warmth * 2) * clamp(1.2 - saturation * 1.2) * clamp(1 - abs(brightness - 0.5) * 1.5),
+        # Cool, desaturated and structured: steel, glass, architecture
+        "modern": clamp(0.5 - warmth * 2) * clamp(1 - saturation * 2) * clamp(edges * 4),
+        # Warm pinks, bright, soft and harmonious
+        "romantic": clamp(0.2 + features["pinkness"] * 4) * clamp(brightness * 1.2) * clamp(1 - edges * 3)
+                    * clamp(1.3 - spread * 1.3),
+        # Few colors, calm texture, light or neutral
+        "minimalist": clamp(1 - spread * 1.5) * clamp(1 - edges * 4) * clamp(1 - saturation * 2),
+        # Saturated, varied and busy
+        "bohemian": clamp(saturation * 1.5) * clamp(spread * 1.5) * clamp(0.5 + warmth * 2)
+    }
+
+
+def analyze_thumbnail(image: "Image.Image", top: int = 2) -> Dict[str, Any]:
+    """Style analysis of an image already decoded by ``load_thumbnail``"""
+    features = extract_image_features(image)
+    scores = score_styles(features)
+    ranked: List[str] = sorted(STYLES, key=lambda style: scores[style], reverse=True)
+    top_score = scores[ranked[0]]
+    return {
+        "styles": ranked[:top],
+        "style_scores": {style: round(score, 3) for style, score in scores.items()},
+        "confidence": round(0.6 + 0.35 * top_score, 3),
+        "features": features
+    }
+
+
+def analyze_image(data: bytes, top: int = 2) -> Dict[str, Any]:
+    """Full analysis of one upload; safe to run in a worker process"""
+    return analyze_thumbnail(load_thumbnail(data), top)
@@ -0,0 +1,186 @@
+"""
+Perceptual-hash cache for image analysis results.
+
+Uploads are keyed two ways: a SHA-256 of the raw bytes catches exact
+re-uploads without decoding anything, and a 64-bit difference hash
+(dHash) of a tiny thumbnail catches re-encoded or resized copies within a
+Hamming-distance threshold. dHash only sees luminance gradients, so the
+thumbnail's mean color must also agree before a near match counts; the
+style analysis depends heavily on color.
+
+A new upload is first signed from a draft decode at signature size, which
+JPEG decoders do at an eighth of full resolution. Only when no
+near-duplicate is cached is it decoded again for the full analysis.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from image_analysis import load_thumbnail
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+HASH_SIZE = 8
+# Decode size for signing; enough detail for the 9x8 dHash thumbnail
+SIGNATURE_SIZE = 32
+READ_CHUNK_SIZE = 64 * 1024
+
+
+# (dHash, mean RGB color) of an image thumbnail
+Signature = Tuple[int, Tuple[int, int, int]]
+
+
+def thumbnail_signature(image: "Image.Image", hash_size: int = HASH_SIZE) -> Signature:
+    """Difference hash (one bit per adjacent pixel pair) plus mean color of an RGB image"""
+    from PIL import Image
+
+    thumbnail = image.resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(thumbnail.convert("L"), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    phash = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    color = tuple(int(c) for c in np.asarray(thumbnail).reshape(-1, 3).mean(axis=0))
+    return phash, color
+
+
+def sign_image(data: bytes) -> Signature:
+    """Signature of an upload from a cheap draft decode; runs in the image workers"""
+    return thumbnail_signature(load_thumbnail(data, SIGNATURE_SIZE))
+
+
+class UploadTooLarge(ValueError):
+    """The upload has more bytes than the reader accepts"""
+
+
+async def read_upload(upload, max_bytes: Optional[int] = None,
+                      chunk_size: int = READ_CHUNK_SIZE) -> Tuple[str, bytes]:
+    """Read an UploadFile in chunks, returning its SHA-256 digest and bytes.
+
+    Reading stops with ``UploadTooLarge`` as soon as more than ``max_bytes``
+    have arrived, so an oversized upload is never held in memory whole.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+        digest.update(chunk)
+        chunks.append(chunk)
+    return digest.hexdigest(), b"".join(chunks)
+
+
+class PerceptualHashCache:
+    """Bounded LRU of analysis results keyed by perceptual hash.
+
+    Hashes live in a fixed-size NumPy array so a near-duplicate lookup is
+    one vectorized XOR and popcount over every resident entry.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_distance: int = 6, color_tolerance: int = 24):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.color_tolerance = color_tolerance
+        self._hashes = np.zeros(max_entries, dtype=">u8")
+        self._colors = np.zeros((max_entries, 3), dtype=np.int16)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._slots: "OrderedDict[int, Tuple[Signature, Dict[str, Any]]]" = OrderedDict()
+        self._by_signature: Dict[Signature, int] = {}
+        self._digests: "OrderedDict[str, Signature]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup_digest(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Exact re-upload lookup; no decode needed"""
+        with self._lock:
+            signature = self._digests.get(digest)
+            slot = self._by_signature.get(signature) if signature is not None else None
+            if slot is None:
+                return None
+            self._digests.move_to_end(digest)
+            self._slots.move_to_end(slot)
+            self.exact_hits += 1
+            return self._slots[slot][1]
+
+    def _nearest(self, signature: Signature) -> Optional[int]:
+        phash, color = signature
+        xor = self._hashes ^ np.array(phash, dtype=">u8")
+        distances = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        color_close = np.abs(self._colors - np.array(color, dtype=np.int16)).max(axis=1) <= self.color_tolerance
+        distances[~(self._valid & color_close)] = HASH_SIZE * HASH_SIZE + 1
+        slot = int(np.argmin(distances))
+        return slot if distances[slot] <= self.max_distance else None
+
+    def _remember(self, digest: str, signature: Signature, slot: int):
+        self._slots.move_to_end(slot)
+        self._digests[digest] = signature
+        self._digests.move_to_end(digest)
+        # Digests pointing at evicted hashes are dropped lazily
+        while len(self._digests) > self.max_entries * 2:
+            self._digests.popitem(last=False)
+
+    def _find(self, signature: Signature) -> Optional[int]:
+        slot = self._by_signature.get(signature)
+        if slot is None and self._slots:
+            slot = self._nearest(signature)
+        return slot
+
+    def lookup_signature(self, digest: str, signature: Signature) -> Optional[Dict[str, Any]]:
+        """Near-duplicate lookup within ``max_distance`` bits, before any analysis is run"""
+        with self._lock:
+            slot = self._find(signature)
+            if slot is None:
+                return None
+            self.near_hits += 1
+            self._remember(digest, signature, slot)
+            return self._slots[slot][1]
+
+    def store(self, digest: str, signature: Signature, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Cache a freshly analyzed ``result``.
+
+        Returns the cached result for this upload: if a concurrent upload of
+        a near-duplicate was stored first, its result wins, so equivalent
+        images always get the same analysis.
+        """
+        with self._lock:
+            self.misses += 1
+            slot = self._find(signature)
+            if slot is not None:
+                signature, result = self._slots[slot]
+            else:
+                if len(self._slots) >= self.max_entries:
+                    slot, (old_signature, _) = self._slots.popitem(last=False)
+                    del self._by_signature[old_signature]
+                    self.evictions += 1
+                else:
+                    slot = len(self._slots)
+                self._hashes[slot] = signature[0]
+                self._colors[slot] = signature[1]
+                self._valid[slot] = True
+                self._by_signature[signature] = slot
+                self._slots[slot] = (signature, result)
+            self._remember(digest, signature, slot)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._slots),
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.exact_hits + self.near_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Columnar SKU inventory with vectorized top-k retrieval.
+
+Every SKU attribute is held in its own NumPy column. Stone, shape and
+metal are combined at load time into a single design code. Color, clarity
+and setting are interned to small integer codes, and theme tags are
+packed into a 16-bit mask. Ranking a request builds two small lookup
+tables, one over design codes and one over theme masks, and then scores
+every SKU in one vectorized expression: two gathers plus a budget term.
+``argpartition`` then selects the top k without sorting the rest, so no
+per-SKU Python runs at any inventory size.
+
+Inventories are read from a CSV export or from a binary snapshot whose
+columns are memory-mapped, so workers share them through the page cache:
+
+    python inventory.py skus.csv inventory.bin
+    python inventory.py --synthetic 1000000 inventory.bin
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import struct
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from catalog import Catalog, load_catalog
+
+SNAPSHOT_MAGIC = b"LUMINV01"
+
+CSV_COLUMNS = ("sku", "stone_type", "stone_shape", "stone_color", "stone_clarity",
+               "carat_weight", "metal_type", "setting_type", "price")
+
+# Theme tags are packed into a uint16 mask so theme scores are one table lookup
+MAX_THEMES = 16
+THEME_MASKS = np.arange(1 << MAX_THEMES, dtype=np.uint32)
+
+# Relative weight of each scoring term; a perfect match on every term scores their sum
+SCORE_WEIGHTS = {"stone": 4.0, "shape": 2.0, "metal": 2.0, "themes": 1.5, "budget": 3.0}
+
+# Budget score lost per budget-width of overrun above the ceiling
+BUDGET_OVERRUN_PENALTY = 4.0
+
+# Column name -> dtype in memory and in snapshots
+COLUMN_DTYPES = {
+    "sku": "S32",
+    "design": "<i4",
+    "color": "<u2",
+    "clarity": "<u2",
+    "setting": "<u2",
+    "themes": "<u2",
+    "carat": "<f4",
+    "price": "<f8",
+}
+
+
+class InventoryItem(NamedTuple):
+    sku: str
+    stone_type: str
+    stone_shape: str
+    stone_color: str
+    stone_clarity: str
+    carat_weight: float
+    metal_type: str
+    setting_type: str
+    estimated_price: float
+    themes: Tuple[str, ...]
+
+
+def _intern(values: Sequence[str]) -> Tuple[Tuple[str, ...], np.ndarray]:
+    """Distinct names in first-seen order, and each value's code"""
+    codes = {}
+    encoded = np.fromiter((codes.setdefault(value, len(codes)) for value in values),
+                          dtype=np.int64, count=len(values))
+    return tuple(sys.intern(name) for name in codes), encoded
+
+
+@dataclass(frozen=True)
+class Inventory:
+    """Read-only SKU columns and the vocabularies their codes index into"""
+    stones: Tuple[str, ...]
+    shapes: Tuple[str, ...]
+    metals: Tuple[str, ...]
+    colors: Tuple[str, ...]
+    clarities: Tuple[str, ...]
+    settings: Tuple[str, ...]
+    themes: Tuple[str, ...]
+    columns: Dict[str, np.ndarray]
+    version: str
+
+    def __post_init__(self):
+        for values in self.columns.values():
+            values.flags.writeable = False
+        # Rows are sorted by design code, then price, so (design, price)
+        # folds into one ascending key that a single searchsorted can probe
+        price = self.columns["price"]
+        stride = float(2 ** np.ceil(np.log2(price.max() + 2))) if len(price) else 1.0
+        object.__setattr__(self, "_price_stride", stride)
+        object.__setattr__(self, "_search_key", self.columns["design"] * stride + price)
+
+    def __len__(self) -> int:
+        return len(self.columns["price"])
+
+    @classmethod
+    def from_records(cls, records: Dict[str, Sequence], themes: Sequence[Sequence[str]],
+                     version: str) -> "Inventory":
+        """Build from per-column sequences of equal length"""
+        stones, stone_codes = _intern(records["stone_type"])
+        shapes, shape_codes = _intern(records["stone_shape"])
+        metals, metal_codes = _intern(records["metal_type"])
+        colors, color_codes = _intern(records["stone_color"])
+        clarities, clarity_codes = _intern(records["stone_clarity"])
+        settings, setting_codes = _intern(records["setting_type"])
+
+        theme_names: Dict[str, int] = {}
+        masks = np.zeros(len(themes), dtype=COLUMN_DTYPES["themes"])
+        for i, tags in enumerate(themes):
+            for tag in tags:
+                bit = theme_names.setdefault(tag, len(theme_names))
+                if bit >= MAX_THEMES:
+                    raise ValueError(f"Inventory uses more than {MAX_THEMES} theme tags")
+                masks[i] |= 1 << bit
+
+        design = (stone_codes * len(shapes) + shape_codes) * len(metals) + metal_codes
+        price = np.asarray(records["price"], dtype=COLUMN_DTYPES["price"])
+        order = np.lexsort((price, design))
+        skus = np.array(records["sku"], dtype=np.bytes_)
+        if skus.dtype.itemsize > np.dtype(COLUMN_DTYPES["sku"]).itemsize:
+            raise ValueError(f"SKUs are limited to {np.dtype(COLUMN_DTYPES['sku']).itemsize} ASCII characters")
+        columns = {
+            "sku": skus.astype(COLUMN_DTYPES["sku"]),
+            "design": design.astype(COLUMN_DTYPES["design"]),
+            "color": color_codes.astype(COLUMN_DTYPES["color"]),
+            "clarity": clarity_codes.astype(COLUMN_DTYPES["clarity"]),
+            "setting": setting_codes.astype(COLUMN_DTYPES["setting"]),
+            "themes": masks,
+            "carat": np.asarray(records["carat_weight"], dtype=COLUMN_DTYPES["carat"]),
+            "price": price,
+        }
+        return cls(stones, shapes, metals, colors, clarities, settings,
+                   tuple(sys.intern(name) for name in theme_names),
+                   {name: values[order] for name, values in columns.items()}, version)
+
+    def _design_scores(self, stones: Sequence[str], shapes: Sequence[str],
+                       metals: Sequence[str]) -> np.ndarray:
+        """Score of every design code; earlier entries in each list score higher"""
+        def preference(names: Tuple[str, ...], wanted: Sequence[str], weight: float) -> np.ndarray:
+            scores = np.zeros(len(names))
+            for rank, name in enumerate(wanted):
+                if name in names:
+                    code = names.index(name)
+                    scores[code] = max(scores[code], weight * (1 - rank / (2 * len(wanted))))
+            return scores
+
+        stone = preference(self.stones, stones, SCORE_WEIGHTS["stone"])
+        shape = preference(self.shapes, shapes, SCORE_WEIGHTS["shape"])
+        metal = preference(self.metals, metals, SCORE_WEIGHTS["metal"])
+        return (stone[:, None, None] + shape[None, :, None] + metal[None, None, :]).ravel()
+
+    def _theme_scores(self, themes: Sequence[str]) -> np.ndarray:
+        """Score of every possible theme mask: the share of requested themes it carries"""
+        scores = np.zeros(len(THEME_MASKS))
+        for theme in themes:
+            if theme in self.themes:
+                scores += (THEME_MASKS >> self.themes.index(theme)) & 1
+        return scores * (SCORE_WEIGHTS["themes"] / max(len(themes), 1))
+
+    @staticmethod
+    def _budget_scores(price: np.ndarray, budget: Tuple[float, float]) -> np.ndarray:
+        """Full marks inside the budget, scaled down below it, penalized steeply above it"""
+        budget_min, budget_max = max(budget[0], 1.0), budget[1]
+        weight = SCORE_WEIGHTS["budget"]
+        overrun = weight * BUDGET_OVERRUN_PENALTY / max(budget_max - budget_min, 1.0)
+        return weight * np.minimum(price / budget_min, 1.0) - overrun * np.maximum(price - budget_max, 0.0)
+
+    def score(self, themes: Sequence[str], stones: Sequence[str], shapes: Sequence[str],
+              metals: Sequence[str], budget: Tuple[float, float], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Score ``rows`` (every SKU by default) against a request"""
+        design, masks, price = (self.columns[name] for name in ("design", "themes", "price"))
+        if rows is not None:
+            design, masks, price = design[rows], masks[rows], price[rows]
+        return (self._design_scores(stones, shapes, metals)[design]
+                + self._theme_scores(themes)[masks]
+                + self._budget_scores(price, budget))
+
+    def _candidate_rows(self, k: int, design_scores: np.ndarray, best_theme: float,
+                        budget: Tuple[float, float]) -> np.ndarray:
+        """Rows whose best possible score can still reach the top ``k``.
+
+        SKUs priced inside the budget guarantee a score floor: each scores
+        at least its design score plus full budget marks. So do the nearest
+        SKUs either side of the budget, with their own budget score. The
+        best ``k`` floors bound the k-th best score from below. A SKU's score is
+        at most its design score plus ``best_theme`` plus its budget score,
+        so each design block narrows to a price window, found with two
+        searchsorted calls across every design at once.
+        """
+        budget_min, budget_max = max(budget[0], 1.0), budget[1]
+        weight = SCORE_WEIGHTS["budget"]
+        overrun = weight * BUDGET_OVERRUN_PENALTY / max(budget_max - budget_min, 1.0)
+        stride, key = self._price_stride, self._search_key
+        block = np.arange(len(design_scores)) * stride
+
+        # Every price is below stride - 1, so clamping keeps each probe inside its own block
+        ceiling = stride - 1
+        block_starts = np.searchsorted(key, np.append(block, block[-1] + stride))
+        first = np.searchsorted(key, block + min(budget_min, ceiling))
+        last = np.searchsorted(key, block + min(budget_max, ceiling), "right")
+
+        # Floors as (score, rows guaranteed to reach it): every in-budget SKU,
+        # plus the nearest SKU on either side of the budget in each block
+        below = first - 1
+        below = below[below >= block_starts[:-1]]
+        above = last[last < block_starts[1:]]
+        neighbours = np.concatenate([below, above])
+        floors = np.concatenate([
+            design_scores + weight,
+            design_scores[self.columns["design"][neighbours]] + self._budget_scores(self.columns["price"][neighbours], budget)
+        ])
+        counts = np.concatenate([last - first, np.ones(len(neighbours), dtype=np.intp)])
+        order = np.argsort(-floors, kind="stable")
+        covered = np.cumsum(counts[order])
+        if covered[-1] < k:
+            return np.arange(len(self))
+        threshold = floors[order[np.searchsorted(covered, k)]]
+
+        # Budget score each design still needs; a little slack keeps exact ties
+        need = threshold - design_scores - best_theme - 1e-9
+        lowest = np.where(need > 0, budget_min * need / weight, -1.0)
+        highest = np.minimum(budget_max + (weight - need) / overrun, ceiling)
+        starts = np.searchsorted(key, block + np.minimum(lowest, ceiling))
+        stops = np.where(need <= weight, np.searchsorted(key, block + highest, "right"), starts)
+
+        lengths = stops - starts
+        offsets = np.cumsum(lengths) - lengths
+        return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+    def top_k(self, k: int, themes: Sequence[str], stones: Sequence[str], shapes: Sequence[str],
+              metals: Sequence[str], budget: Tuple[float, float]) -> np.ndarray:
+        """Rows of the ``k`` best-scoring SKUs, best first; ties keep storage order.
+
+        Same result as ranking ``score`` over every SKU, but only the
+        SKUs that could make the cut are scored.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        design_scores = self._design_scores(stones, shapes, metals)
+        theme_scores = self._theme_scores(themes)
+        rows = self._candidate_rows(k, design_scores, float(theme_scores.max()), budget)
+
+        columns = self.columns
+        scores = (design_scores[columns["design"][rows]] + theme_scores[columns["themes"][rows]]
+                  + self._budget_scores(columns["price"][rows], budget))
+        # Keep every row tied with the k-th best so ties resolve by storage order
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        top = np.flatnonzero(scores >= kth)
+        return rows[top[np.argsort(-scores[top], kind="stable")[:k]]]
+
+    def find(self, sku: str) -> Optional[int]:
+        """Row of ``sku``, or None; the SKU index is built on first use"""
+        order = getattr(self, "_sku_order", None)
+        if order is None:
+            order = np.argsort(self.columns["sku"], kind="stable")
+            object.__setattr__(self, "_sku_order", order)
+        try:
+            key = sku.encode("ascii")
+        except UnicodeEncodeError:
+            return None
+        skus = self.columns["sku"]
+        position = int(np.searchsorted(skus, key, sorter=order))
+        if position < len(order) and skus[order[position]] == key:
+            return int(order[position])
+        return None
+
+    def item(self, index: int) -> InventoryItem:
+        columns = self.columns
+        metal_count, shape_count = len(self.metals), len(self.shapes)
+        design = int(columns["design"][index])
+        stone, rest = divmod(design, shape_count * metal_count)
+        shape, metal = divmod(rest, metal_count)
+        mask = int(columns["themes"][index])
+        return InventoryItem(
+            sku=columns["sku"][index].decode("ascii"),
+            stone_type=self.stones[stone],
+            stone_shape=self.shapes[shape],
+            stone_color=self.colors[columns["color"][index]],
+            stone_clarity=self.clarities[columns["clarity"][index]],
+            carat_weight=round(float(columns["carat"][index]), 2),
+            metal_type=self.metals[metal],
+            setting_type=self.settings[columns["setting"][index]],
+            estimated_price=float(columns["price"][index]),
+            themes=tuple(theme for bit, theme in enumerate(self.themes) if mask >> bit & 1)
+        )
+
+
+def parse_inventory_csv(raw: bytes) -> Inventory:
+    """Parse a CSV export with CSV_COLUMNS plus optional ``themes`` (``|``-separated)
+    and ``quantity`` columns; SKUs with no stock are skipped"""
+    reader = csv.DictReader(io.StringIO(raw.decode("utf-8")))
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f"Inventory is missing columns: {', '.join(missing)}")
+
+    records: Dict[str, List] = {column: [] for column in CSV_COLUMNS}
+    themes = []
+    for row in reader:
+        if int(row.get("quantity") or 1) <= 0:
+            continue
+        for column in CSV_COLUMNS:
+            records[column].append(row[column])
+        themes.append([tag for tag in (row.get("themes") or "").split("|") if tag])
+    return Inventory.from_records(records, themes, hashlib.sha256(raw).hexdigest()[:12])
+
+
+def write_snapshot(inventory: Inventory, path: Path):
+    """Write a snapshot: magic, header length, JSON header, then 8-byte aligned columns"""
+    layout = {}
+    offset = 0
+    for name, dtype in COLUMN_DTYPES.items():
+        layout[name] = [dtype, offset, len(inventory)]
+        offset += -(-inventory.columns[name].nbytes // 8) * 8
+
+    header = orjson.dumps({
+        "vocabularies": {name: list(getattr(inventory, name)) for name in
+                         ("stones", "shapes", "metals", "colors", "clarities", "settings", "themes")},
+        "columns": layout,
+        "version": inventory.version
+    })
+    header += b" " * (-(len(SNAPSHOT_MAGIC) + 8 + len(header)) % 8)
+
+    path = Path(path)
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, dtype in COLUMN_DTYPES.items():
+            data = np.ascontiguousarray(inventory.columns[name], dtype=dtype).tobytes()
+            f.write(data + b"\0" * (-len(data) % 8))
+    temporary.replace(path)
+
+
+def load_snapshot(path: Path) -> Inventory:
+    """Load a snapshot, memory-mapping its columns read-only"""
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not an inventory snapshot")
+        (header_length,) = struct.unpack("<Q", f.read(8))
+        header = orjson.loads(f.read(header_length))
+
+    data_offset = len(SNAPSHOT_MAGIC) + 8 + header_length
+    columns = {
+        name: np.memmap(path, dtype=dtype, mode="r", offset=data_offset + offset, shape=(length,))
+        if length else np.empty(0, dtype=dtype)
+        for name, (dtype, offset, length) in header["columns"].items()
+    }
+    vocabularies = {name: tuple(sys.intern(value) for value in values)
+                    for name, values in header["vocabularies"].items()}
+    return Inventory(**vocabularies, columns=columns, version=header["version"])
+
+
+def load_inventory(path: Path) -> Inventory:
+    """Load a snapshot or a CSV export, whichever ``path`` holds"""
+    path = Path(path)
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC:
+            return load_snapshot(path)
+    return parse_inventory_csv(path.read_bytes())
+
+
+def synthetic_inventory(catalog: Catalog, count: int, themes: Sequence[str], seed: int = 0) -> Inventory:
+    """A reproducible inventory of ``count`` SKUs drawn from the catalog, for load testing"""
+    rng = np.random.default_rng(seed)
+    stones = np.array(catalog.stones.names)
+    stone = rng.choice(len(stones), count, p=np.where(stones == "diamond", 0.6, 0.4 / max(len(stones) - 1, 1)))
+    shape = rng.integers(len(catalog.shapes), size=count)
+    metal = rng.integers(len(catalog.metals), size=count)
+    setting = rng.integers(len(catalog.settings), size=count)
+    carat = np.round(rng.uniform(0.3, 3.5, count), 2)
+
+    grades = [catalog.details["stones"].get(name, {}) for name in catalog.stones.names]
+    grade = rng.integers(3, size=count)
+    color = [grades[s].get("colors", ["natural"])[g % len(grades[s].get("colors", ["natural"]))]
+             for s, g in zip(stone.tolist(), grade.tolist())]
+    clarity = [grades[s].get("clarity_grades", ["eye-clean"])[g % len(grades[s].get("clarity_grades", ["eye-clean"]))]
+               for s, g in zip(stone.tolist(), grade.tolist())]
+
+    price = (catalog.stones.columns["price_per_carat"][stone] * carat ** 1.5
+             * catalog.shapes.columns["price_premium"][shape]
+             + catalog.metals.columns["price_per_gram"][metal] * 6) \
+        * catalog.settings.columns["price_multiplier"][setting] * rng.lognormal(0, 0.15, count)
+
+    tags = rng.integers(1 << len(themes), size=count) & rng.integers(1 << len(themes), size=count)
+    records = {
+        "sku": [f"LUM-{i:08d}" for i in range(count)],
+        "stone_type": stones[stone].tolist(),
+        "stone_shape": np.array(catalog.shapes.names)[shape].tolist(),
+        "stone_color": color,
+        "stone_clarity": clarity,
+        "carat_weight": carat,
+        "metal_type": np.array(catalog.metals.names)[metal].tolist(),
+        "setting_type": np.array(catalog.settings.names)[setting].tolist(),
+        "price": np.round(price, 2),
+    }
+    sku_themes = [[theme for bit, theme in enumerate(themes) if mask >> bit & 1] for mask in tags.tolist()]
+    return Inventory.from_records(records, sku_themes, f"synthetic-{count}-{seed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile an inventory CSV into a memory-mappable snapshot")
+    parser.add_argument("source", nargs="?", help="CSV export to compile")
+    parser.add_argument("snapshot", type=Path, nargs="?", default=Path("inventory.bin"))
+    parser.add_argument("--synthetic", type=int, metavar="COUNT",
+                        help="Generate COUNT SKUs from the catalog instead of reading a CSV")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        if args.source:
+            args.snapshot = Path(args.source)
+        from main import STORY_KEYWORDS
+        inventory = synthetic_inventory(load_catalog(), args.synthetic, list(STORY_KEYWORDS))
+    elif args.source:
+        inventory = parse_inventory_csv(Path(args.source).read_bytes())
+    else:
+        parser.error("a CSV source or --synthetic is required")
+
+    write_snapshot(inventory, args.snapshot)
+    print(f"Wrote {args.snapshot} (version {inventory.version}): {len(inventory)} SKUs, "
+          f"{len(inventory.stones) * len(inventory.shapes) * len(inventory.metals)} design codes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Load-generation harness for the Jewelry Recommender API
+
+Drives the FastAPI app in-process through an ASGI transport, or a running
+server with --url, using a weighted mix of story, preference, upload and
+shortlist traffic. Prints throughput, latency percentiles and error rates
+as JSON.
+
+Every request is made unique by default: stories and preferences carry a
+request number in a field the pipeline ignores, and each upload is a newly
+drawn image. With the small built-in corpus, replaying payloads verbatim
+(--repeat-payloads) would turn nearly every request into a cache hit.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import random
+import secrets
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+DEFAULT_MIX = {"story": 5, "preferences": 3, "upload": 1, "shortlist": 1}
+
+# Built-in payload corpus, used when no --corpus file is given
+DEFAULT_CORPUS = {
+    "stories": [
+        {
+            "love_story": "We met hiking in the mountains and watched the sunset from the summit.",
+            "personality": "She's adventurous, creative and loves the outdoors",
+            "special_moments": "The way she laughs when we get lost on a trail"
+        },
+        {
+            "love_story": "Her grandmother's heirloom ring inspired our love of vintage antiques.",
+            "personality": "Romantic, classic and a little old-fashioned",
+            "style_preferences": "Art deco details, rose gold, candles and roses",
+            "special_moments": "Dancing in the kitchen, her eyes in candlelight"
+        },
+        {
+            "love_story": "We are both architects who love clean, modern, minimal design.",
+            "personality": "Quiet, refined and professional",
+            "style_preferences": "Sleek and understated"
+        },
+        {
+            "love_story": " ".join(["We travel, explore and discover new places together."] * 60),
+            "personality": "Free-spirited, boho, eclectic and artistic",
+            "special_moments": "Painting together in a gallery in Lisbon, her hands covered in paint"
+        }
+    ],
+    "preferences": [
+        {"ring_type": "engagement", "budget_range": "5000-10000", "metal_type": "platinum"},
+        {"ring_type": "engagement", "budget_range": "10000-20000"},
+        {"ring_type": "anniversary", "budget_range": "20000-50000", "metal_type": "rose_gold"},
+        {"ring_type": "engagement", "budget_range": "50000-100000"},
+        {"ring_type": "engagement", "budget_range": "100000+", "metal_type": "yellow_gold"},
+        {"ring_type": "engagement", "budget_range": "consultation"}
+    ],
+    "image_colors": [[160, 120, 80], [150, 160, 175], [240, 180, 200], [245, 245, 245], [40, 120, 60]]
+}
+
+
+def build_images(colors: List[List[int]], size=(640, 480)) -> List[bytes]:
+    """Render one JPEG per color, with stripes so images differ in texture"""
+    from PIL import Image, ImageDraw
+
+    images = []
+    for i, color in enumerate(colors):
+        image = Image.new("RGB", size, tuple(color))
+        draw = ImageDraw.Draw(image)
+        for x in range(0, size[0], 16 + i * 8):
+            draw.line([(x, 0), (x, size[1])], fill=(30, 30, 40), width=2)
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def build_varied_image(color: List[int], seed: str, size=(640, 480)) -> bytes:
+    """Render a JPEG of jittered ``color`` with random blocks, so no two seeds look alike"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    base = tuple(max(0, min(255, c + rng.randint(-40, 40))) for c in color)
+    image = Image.new("RGB", size, base)
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle([x, y, x + rng.randint(40, 240), y + rng.randint(40, 240)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class LoadTest:
+    """Weighted request mix run by a fixed number of concurrent workers"""
+
+    def __init__(self, client: httpx.AsyncClient, corpus: Dict, mix: Dict[str, float], seed: int = 0,
+                 repeat_payloads: bool = False):
+        self.client = client
+        self.corpus = corpus
+        self.repeat_payloads = repeat_payloads
+        self.images = build_images(corpus["image_colors"]) if repeat_payloads else []
+        # Distinguishes this run's payloads from any earlier run against the same server
+        self.nonce = secrets.token_hex(4)
+        self.sequence = 0
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.rng = random.Random(seed)
+        self.session_ids: List[str] = []
+        self.design_ids: List[str] = []
+        self.latencies: Dict[str, List[float]] = {kind: [] for kind in self.kinds}
+        self.statuses: Dict[str, Dict[str, int]] = {kind: {} for kind in self.kinds}
+
+    def _remember(self, response: httpx.Response):
+        if response.status_code != 200:
+            return
+        body = response.json()
+        if "session_id" in body:
+            self.session_ids.append(body["session_id"])
+            self.design_ids.extend(s["id"] for s in body.get("suggestions", []))
+            # Keep the pools small so shortlist traffic targets recent sessions
+            del self.session_ids[:-256], self.design_ids[:-1024]
+
+    def _unique(self, payload: Dict, field: str) -> Dict:
+        """``payload`` tagged with a request number, so it misses the recommendation cache"""
+        if self.repeat_payloads:
+            return payload
+        self.sequence += 1
+        return {**payload, field: f"load test {self.nonce} request {self.sequence}"}
+
+    async def _upload_images(self) -> List[bytes]:
+        if self.repeat_payloads:
+            return self.rng.sample(self.images, k=min(2, len(self.images)))
+        colors = self.corpus["image_colors"]
+        seeds = [(self.rng.choice(colors), f"{self.nonce}-{self.rng.getrandbits(32)}") for _ in range(2)]
+        # Rendering is CPU work; keep it off the loop that also runs the in-process app
+        return await asyncio.to_thread(lambda: [build_varied_image(color, seed) for color, seed in seeds])
+
+    async def _request(self, kind: str) -> Optional[httpx.Response]:
+        rng = self.rng
+        if kind == "story":
+            payload = {"story": self._unique(rng.choice(self.corpus["stories"]), "timeline"),
+                       "preferences": rng.choice(self.corpus["preferences"])}
+            return await self.client.post("/api/story-recommendations", json=payload)
+        if kind == "preferences":
+            payload = self._unique(rng.choice(self.corpus["preferences"]), "design_inspiration")
+            return await self.client.post("/api/preferences", json=payload)
+        if kind == "upload":
+            files = [("files", (f"inspiration_{i}.jpg", image, "image/jpeg"))
+                     for i, image in enumerate(await self._upload_images())]
+            return await self.client.post("/api/upload-images", files=files)
+        if kind == "shortlist":
+            if not self.session_ids:
+                return None
+            payload = {"design_id": rng.choice(self.design_ids) if self.design_ids else None,
+                       "user_session": rng.choice(self.session_ids)}
+            return await self.client.post("/api/shortlist", json=payload)
+        raise ValueError(f"Unknown request kind: {kind}")
+
+    async def _worker(self, deadline: float, remaining: List[int]):
+        while time.perf_counter() < deadline and (remaining[0] is None or remaining[0] > 0):
+            if remaining[0] is not None:
+                remaining[0] -= 1
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await self._request(kind)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            else:
+                if response is None:
+                    continue
+                status = str(response.status_code)
+                self._remember(response)
+            self.latencies[kind].append(time.perf_counter() - started)
+            self.statuses[kind][status] = self.statuses[kind].get(status, 0) + 1
+
+    async def run(self, concurrency: int, duration: float, requests: Optional[int] = None) -> Dict:
+        remaining = [requests]
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(self._worker(deadline, remaining) for _ in range(concurrency)))
+        return self.report(time.perf_counter() - started, concurrency)
+
+    def report(self, elapsed: float, concurrency: int) -> Dict:
+        by_kind = {}
+        all_latencies = []
+        total_errors = 0
+        for kind in self.kinds:
+            latencies = self.latencies[kind]
+            errors = sum(count for status, count in self.statuses[kind].items() if status != "200")
+            total_errors += errors
+            all_latencies.extend(latencies)
+            by_kind[kind] = {
+                "requests": len(latencies),
+                "error_rate": errors / len(latencies) if latencies else 0.0,
+                "statuses": self.statuses[kind],
+                **latency_summary(latencies)
+            }
+        return {
+            "concurrency": concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": len(all_latencies),
+            "throughput_rps": round(len(all_latencies) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": total_errors / len(all_latencies) if all_latencies else 0.0,
+            **latency_summary(all_latencies),
+            "by_kind": by_kind
+        }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0
+    }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse "story=5,preferences=3,upload=1,shortlist=1" """
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown request kind: {kind}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    """Wait for the readiness check, as a load balancer would before routing traffic"""
+    deadline = time.perf_counter() + max(timeout, 60.0)
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/api/health/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not become ready")
+
+
+async def run_load_test(args) -> Dict:
+    corpus = dict(DEFAULT_CORPUS)
+    if args.corpus:
+        corpus.update(json.loads(Path(args.corpus).read_text()))
+
+    async with contextlib.AsyncExitStack() as stack:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        else:
+            from main import app
+            # ASGITransport skips lifespan; run the startup and shutdown handlers
+            # so warm-up, watchers and the similarity index run as in production
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                       base_url="http://loadtest", timeout=args.timeout)
+        await stack.enter_async_context(client)
+        await wait_until_ready(client, args.timeout)
+
+        load_test = LoadTest(client, corpus, args.mix, seed=args.seed, repeat_payloads=args.repeat_payloads)
+        if args.warmup:
+            await load_test.run(args.concurrency, args.warmup)
+            load_test = LoadTest(client, corpus, args.mix, seed=args.seed, repeat_payloads=args.repeat_payloads)
+        return await load_test.run(args.concurrency, args.duration, args.requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Jewelry Recommender API")
+    parser.add_argument("--url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured warm-up seconds")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Request weights, e.g. story=5,preferences=3,upload=1,shortlist=1")
+    parser.add_argument("--corpus", help="JSON file with stories, preferences and image_colors")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat-payloads", action="store_true",
+                        help="Replay corpus payloads verbatim, measuring the cache-hit path")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit non-zero if overall p95 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, help="Exit non-zero if the error rate exceeds this")
+    parser.add_argument("--min-throughput", type=float, help="Exit non-zero if requests/second falls below this")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+    failures = []
+    if args.max_p95_ms is not None and report["p95_ms"] > args.max_p95_ms:
+        failures.append(f"p95 {report['p95_ms']}ms > {args.max_p95_ms}ms")
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.3f} > {args.max_error_rate}")
+    if args.min_throughput is not None and report["throughput_rps"] < args.min_throughput:
+        failures.append(f"throughput {report['throughput_rps']} < {args.min_throughput} req/s")
+    if failures:
+        print("Load test thresholds failed: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
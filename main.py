@@ -1,17 +1,44 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-import json
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import hmac
+import logging
+import orjson
 import random
 import re
+import secrets
+import threading
+import time
 from datetime import datetime
 import os
 from dataclasses import dataclass
+from functools import partial
+from catalog import DEFAULT_SOURCE, Catalog, CatalogVersionUnavailable, CatalogWatcher
+from compression import CompressionMiddleware
+from design_engine import DesignSpaceEngine
+from design_registry import DesignRegistry, design_key
+from inventory import InventoryItem, load_inventory
+from similarity import DesignEncoder, SimilarDesigns
+from execution import BoundedExecutor, ExecutorSaturated
+from image_analysis import ImageTooLarge, analyze_image
+from image_analysis import preload as preload_image_libraries
+from image_cache import PerceptualHashCache, UploadTooLarge, read_upload, sign_image
+from metrics import (REGISTRY, MetricsMiddleware, collect_stages, observe_stage, pipeline, pipeline_context,
+                     replay_stages, stage)
+from profiling import MemoryProfiler, ProfilerBusy, ProfilingMiddleware, SamplingProfiler
+from recommendation_cache import RecommendationCache, request_fingerprint, seeded_rng
+from session_store import create_session_store
+from static_assets import StaticAssets
+from story_matcher import KeywordMatcher
 
-app = FastAPI(title="Premium Jewelry Recommender API", version="2.0.0")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Premium Jewelry Recommender API", version="2.0.0", default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -22,42 +49,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Serve static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# API responses compressed for clients that accept it; streams are flushed per chunk
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get("LUMIERE_COMPRESS_MIN_BYTES", "1024")),
+    gzip_level=int(os.environ.get("LUMIERE_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.environ.get("LUMIERE_BROTLI_QUALITY", "4"))
+)
+
+# Request counters and latency histograms, served on /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Admin-only profiling; without a token the routes 404 and nothing is installed
+ADMIN_TOKEN = os.environ.get("LUMIERE_ADMIN_TOKEN", "")
+MAX_PROFILE_SECONDS = float(os.environ.get("LUMIERE_MAX_PROFILE_SECONDS", "120"))
 
-# Enhanced jewelry database with premium focus
+cpu_profiler = SamplingProfiler()
+memory_profiler = MemoryProfiler()
+
+if ADMIN_TOKEN:
+    app.add_middleware(ProfilingMiddleware, profiler=cpu_profiler)
+
+# Frontend files, held in memory precompressed and reloaded when they change on disk
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+static_assets = StaticAssets(
+    STATIC_DIR,
+    interval=float(os.environ.get("LUMIERE_STATIC_RELOAD_INTERVAL", "2.0")),
+    max_age=int(os.environ.get("LUMIERE_STATIC_MAX_AGE", "3600"))
+)
+
+# Enhanced jewelry database with premium focus; prices live in the catalog
 PREMIUM_JEWELRY_DATA = {
     "diamonds": {
-        "round": {"brilliance": "exceptional", "price_premium": 1.0, "story_themes": ["timeless", "classic", "eternal"]},
-        "princess": {"brilliance": "excellent", "price_premium": 0.85, "story_themes": ["modern", "bold", "confident"]},
-        "cushion": {"brilliance": "romantic", "price_premium": 0.80, "story_themes": ["vintage", "romantic", "soft"]},
-        "emerald": {"brilliance": "elegant", "price_premium": 0.75, "story_themes": ["sophisticated", "art deco", "architectural"]},
-        "oval": {"brilliance": "graceful", "price_premium": 0.90, "story_themes": ["elongating", "graceful", "unique"]},
-        "pear": {"brilliance": "unique", "price_premium": 0.75, "story_themes": ["teardrops of joy", "unique", "artistic"]},
-        "marquise": {"brilliance": "dramatic", "price_premium": 0.70, "story_themes": ["regal", "dramatic", "vintage"]},
-        "heart": {"brilliance": "romantic", "price_premium": 0.75, "story_themes": ["ultimate love", "romantic", "symbolic"]}
+        "round": {"brilliance": "exceptional", "story_themes": ["timeless", "classic", "eternal"]},
+        "princess": {"brilliance": "excellent", "story_themes": ["modern", "bold", "confident"]},
+        "cushion": {"brilliance": "romantic", "story_themes": ["vintage", "romantic", "soft"]},
+        "emerald": {"brilliance": "elegant", "story_themes": ["sophisticated", "art deco", "architectural"]},
+        "oval": {"brilliance": "graceful", "story_themes": ["elongating", "graceful", "unique"]},
+        "pear": {"brilliance": "unique", "story_themes": ["teardrops of joy", "unique", "artistic"]},
+        "marquise": {"brilliance": "dramatic", "story_themes": ["regal", "dramatic", "vintage"]},
+        "heart": {"brilliance": "romantic", "story_themes": ["ultimate love", "romantic", "symbolic"]}
     },
     "premium_metals": {
         "platinum": {
-            "price_per_gram": 45,
             "durability": "lifetime",
             "story": "Rarer than gold, platinum represents eternal commitment",
             "personality_match": ["sophisticated", "classic", "refined"]
         },
         "white_gold": {
-            "price_per_gram": 65,
             "durability": "excellent",
             "story": "Modern elegance with timeless appeal",
             "personality_match": ["contemporary", "clean", "minimalist"]
         },
         "yellow_gold": {
-            "price_per_gram": 70,
             "durability": "excellent", 
             "story": "Traditional warmth and golden memories",
             "personality_match": ["traditional", "warm", "classic"]
         },
         "rose_gold": {
-            "price_per_gram": 68,
             "durability": "excellent",
             "story": "Romantic blush of copper creates unique beauty",
             "personality_match": ["romantic", "unique", "artistic", "bohemian"]
@@ -85,6 +134,15 @@ STORY_KEYWORDS = {
     "adventurous": ["travel", "adventure", "explore", "journey", "discover", "wanderlust"]
 }
 
+EMOTION_WORDS = ["love", "joy", "happiness", "passion", "devotion", "cherish", "adore"]
+
+PERSONALITY_TRAIT_KEYWORDS = {
+    "introverted": ["quiet", "introverted", "shy", "private"],
+    "extroverted": ["outgoing", "social", "party", "friends"],
+    "creative": ["creative", "artistic", "paint", "design"],
+    "active": ["active", "sports", "hiking", "gym"]
+}
+
 # Pydantic models
 class StoryData(BaseModel):
     love_story: Optional[str] = None
@@ -116,14 +174,17 @@ class PremiumDesign(BaseModel):
     metal_type: str
     setting_type: str
     estimated_price: float
-    rationale: str
+    rationale: Optional[str] = None
     story_connection: Optional[str] = None
     style_tags: List[str]
-    premium_features: List[str]
+    premium_features: Optional[List[str]] = None
+
+# Text fields rendered only when a response asks for them
+NARRATIVE_FIELDS = ("rationale", "story_connection", "premium_features")
 
-# In-memory storage
-user_sessions = {}
-story_sessions = {}
+# Session storage, selected by LUMIERE_SESSION_BACKEND (memory or sqlite)
+user_sessions = create_session_store("user")
+story_sessions = create_session_store("story")
 
 @dataclass
 class StoryAnalysis:
@@ -146,30 +207,22 @@ def analyze_story_text(story_data: StoryData) -> StoryAnalysis:
     
     themes = []
     style_indicators = []
-    personality_traits = []
-    emotional_keywords = []
+    
+    matches = STORY_MATCHER.match(full_text)
     
     # Analyze for story themes
-    for theme, keywords in STORY_KEYWORDS.items():
-        keyword_count = sum(1 for keyword in keywords if keyword in full_text)
+    for theme in STORY_KEYWORDS:
+        keyword_count = len(matches["themes"].get(theme, ()))
         if keyword_count > 0:
             themes.append(theme)
             if keyword_count >= 2:  # Strong indicator
                 style_indicators.append(theme)
     
     # Extract emotional keywords
-    emotion_words = ["love", "joy", "happiness", "passion", "devotion", "cherish", "adore"]
-    emotional_keywords = [word for word in emotion_words if word in full_text]
+    emotional_keywords = [word for word in EMOTION_WORDS if word in matches["emotions"]]
     
     # Determine personality traits from text patterns
-    if any(word in full_text for word in ["quiet", "introverted", "shy", "private"]):
-        personality_traits.append("introverted")
-    if any(word in full_text for word in ["outgoing", "social", "party", "friends"]):
-        personality_traits.append("extroverted")
-    if any(word in full_text for word in ["creative", "artistic", "paint", "design"]):
-        personality_traits.append("creative")
-    if any(word in full_text for word in ["active", "sports", "hiking", "gym"]):
-        personality_traits.append("active")
+    personality_traits = [trait for trait in PERSONALITY_TRAIT_KEYWORDS if trait in matches["traits"]]
     
     # Generate recommendations based on analysis
     recommended_elements = {}
@@ -192,6 +245,11 @@ def analyze_story_text(story_data: StoryData) -> StoryAnalysis:
     else:
         recommended_elements["shapes"] = ["round", "oval", "cushion"]
     
+    # Recommend any colored stones the story names
+    stones = [stone for stone in STONE_KEYWORDS if stone in matches["stones"]]
+    if stones:
+        recommended_elements["stones"] = stones
+    
     return StoryAnalysis(
         themes=themes[:3],  # Top 3 themes
         style_indicators=style_indicators,
@@ -200,8 +258,14 @@ def analyze_story_text(story_data: StoryData) -> StoryAnalysis:
         recommended_elements=recommended_elements
     )
 
-def generate_story_connection(design: Dict, story_analysis: StoryAnalysis, story_data: StoryData) -> str:
-    """Generate a personalized story connection for each design"""
+def generate_story_connection(design: Dict, story_analysis: StoryAnalysis, story_data: StoryData,
+                              rng=random, render: bool = True) -> Optional[str]:
+    """Generate a personalized story connection for each design.
+
+    Candidates are collected as templates and only the chosen one is
+    formatted. With ``render=False`` the choice is still drawn, so the
+    generator advances exactly as if the text had been rendered.
+    """
     
     connections = []
     
@@ -210,7 +274,7 @@ def generate_story_connection(design: Dict, story_analysis: StoryAnalysis, story
         if design["stone_shape"] == "heart":
             connections.append("The heart shape literally embodies the love you share")
         elif design["stone_shape"] == "round":
-            connections.append("Like your love, a round diamond has no beginning or end - it's eternal")
+            connections.append("Like your love, a round {stone} has no beginning or end - it's eternal")
         elif design["metal_type"] == "rose_gold":
             connections.append("Rose gold's warm blush mirrors the romantic glow you bring to each other's lives")
     
@@ -234,7 +298,7 @@ def generate_story_connection(design: Dict, story_analysis: StoryAnalysis, story
     if story_data.special_moments:
         special_text = story_data.special_moments.lower()
         if "laugh" in special_text:
-            connections.append("The way light dances through this diamond reminds us of how she lights up when she laughs")
+            connections.append("The way light dances through this {stone} reminds us of how she lights up when she laughs")
         if "hands" in special_text:
             connections.append("Designed to complement the graceful hands that create such beautiful art")
         if "eyes" in special_text:
@@ -242,24 +306,30 @@ def generate_story_connection(design: Dict, story_analysis: StoryAnalysis, story
     
     # Default connection if no specific matches
     if not connections:
-        connections.append(f"This {design['stone_shape']} diamond in {design['metal_type'].replace('_', ' ')} celebrates your unique love story")
+        connections.append("This {shape} {stone} in {metal} celebrates your unique love story")
     
-    return random.choice(connections)
+    template = rng.choice(connections)
+    if not render:
+        return None
+    return template.format(stone=design.get("stone_type", "diamond"), shape=design["stone_shape"],
+                           metal=design["metal_type"].replace("_", " "))
 
-def calculate_premium_price(stone_shape: str, carat_weight: float, metal_type: str, 
-                          setting_complexity: float = 1.0, story_premium: bool = False) -> float:
-    """Calculate price with premium considerations"""
+def premium_price_formula(shape_premium, carat_weight, metal_price_per_gram,
+                          setting_complexity: float = 1.0, story_premium: bool = False,
+                          stone_factor=1.0):
+    """Raw premium price; accepts scalars or NumPy arrays.
+
+    ``stone_factor`` scales the stone cost relative to a diamond.
+    """
     
     # Base diamond price (premium quality assumed)
     base_diamond_price = 8000  # Premium grade diamonds
-    shape_premium = PREMIUM_JEWELRY_DATA["diamonds"].get(stone_shape, {}).get("price_premium", 1.0)
     
     # Carat weight with exponential pricing
-    carat_price = base_diamond_price * (carat_weight ** 1.5) * shape_premium
+    carat_price = base_diamond_price * stone_factor * (carat_weight ** 1.5) * shape_premium
     
     # Premium metal pricing
-    metal_data = PREMIUM_JEWELRY_DATA["premium_metals"].get(metal_type, {})
-    metal_price = metal_data.get("price_per_gram", 50) * 6  # 6g average for premium setting
+    metal_price = metal_price_per_gram * 6  # 6g average for premium setting
     
     # Setting complexity
     setting_base = 1200 * setting_complexity  # Premium craftsmanship
@@ -267,134 +337,263 @@ def calculate_premium_price(stone_shape: str, carat_weight: float, metal_type: s
     # Story customization premium
     story_premium_cost = 800 if story_premium else 0
     
-    total = carat_price + metal_price + setting_base + story_premium_cost
+    return carat_price + metal_price + setting_base + story_premium_cost
+
+def calculate_premium_price(stone_shape: str, carat_weight: float, metal_type: str, 
+                          setting_complexity: float = 1.0, story_premium: bool = False,
+                          stone_type: str = "diamond") -> float:
+    """Calculate price with premium considerations"""
+    
+    catalog = catalog_watcher.current.catalog
+    total = premium_price_formula(
+        catalog.shapes.value("price_premium", stone_shape, 1.0), carat_weight,
+        catalog.metals.value("price_per_gram", metal_type, 50),
+        setting_complexity=setting_complexity, story_premium=story_premium,
+        stone_factor=catalog.stone_price_factor(stone_type)
+    )
     return round(total, 2)
 
+# Suggestions are always priced with this setting complexity and the story premium
+SUGGESTION_SETTING_COMPLEXITY = 1.3
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """A catalog and the design space priced from it, published as one unit"""
+    catalog: Catalog
+    engine: DesignSpaceEngine
+    
+    @property
+    def version(self) -> str:
+        return self.catalog.version
+
+def build_catalog_snapshot(catalog: Catalog) -> CatalogSnapshot:
+    return CatalogSnapshot(catalog, DesignSpaceEngine(
+        catalog,
+        price_formula=partial(premium_price_formula, setting_complexity=SUGGESTION_SETTING_COMPLEXITY, story_premium=True)
+    ))
+
+# Catalog from sample_data.json, reloaded in the background when the file changes
+catalog_watcher = CatalogWatcher(
+    build_catalog_snapshot,
+    source=os.environ.get("LUMIERE_CATALOG_PATH") or DEFAULT_SOURCE,
+    snapshot=os.environ.get("LUMIERE_CATALOG_SNAPSHOT") or None,
+    interval=float(os.environ.get("LUMIERE_CATALOG_RELOAD_SECONDS", "2"))
+)
+
+# SKU inventory to recommend from; without one, designs are composed from the catalog
+INVENTORY_PATH = os.environ.get("LUMIERE_INVENTORY_PATH")
+inventory = load_inventory(INVENTORY_PATH) if INVENTORY_PATH else None
+
+# Colored stones named in a story, from the catalog at startup; "emerald" is skipped
+# as it usually means the cut
+STONE_KEYWORDS = {stone: [stone] for stone in catalog_watcher.current.catalog.stones
+                  if stone != "diamond" and stone not in catalog_watcher.current.catalog.shapes}
+
+# Compiled once at import so each story is tokenized and matched in one pass
+STORY_MATCHER = KeywordMatcher({
+    "themes": STORY_KEYWORDS,
+    "emotions": {word: [word] for word in EMOTION_WORDS},
+    "traits": PERSONALITY_TRAIT_KEYWORDS,
+    "stones": STONE_KEYWORDS
+})
+
+
+BUDGET_RANGES = {
+    "5000-10000": (5000, 10000),
+    "10000-20000": (10000, 20000),
+    "20000-50000": (20000, 50000),
+    "50000-100000": (50000, 100000),
+    "100000+": (100000, 500000),
+    "consultation": (20000, 100000)
+}
+
+# Suggestions cycle through these approaches
+SUGGESTION_APPROACHES = [
+    {"focus": "story_optimized", "carat_range": (0.8, 1.5)},
+    {"focus": "balanced", "carat_range": (1.0, 2.0)},
+    {"focus": "statement", "carat_range": (1.5, 3.0)}
+]
+
+# Style tags a design can carry, as vector features for similar-design search
+SIMILARITY_TAGS = list(STORY_KEYWORDS) + ["classic"] + [approach["focus"] for approach in SUGGESTION_APPROACHES]
+
+SETTING_OPTIONS = {
+    "vintage": ["vintage", "halo", "milgrain"],
+    "modern": ["prong", "bezel", "tension"],
+    "romantic": ["halo", "vintage", "pave"]
+}
+
+DIAMOND_CLARITY_OPTIONS = ["FL", "IF", "VVS1", "VVS2", "VS1"]
+
+def suggestion_stones(preferences: PremiumPreferences, story_analysis: StoryAnalysis,
+                      catalog: Catalog) -> List[str]:
+    """Center stones to draw from: the customer's pick, else any the story names, else diamond"""
+    if preferences.center_stone in catalog.stones:
+        return [preferences.center_stone]
+    if preferences.center_stone == "alternative":
+        return [stone for stone in catalog.stones if stone != "diamond"]
+    return story_analysis.recommended_elements.get("stones", ["diamond"])
+
+def stone_grades(stone_type: str, catalog: Catalog, rng=random) -> Tuple[str, str]:
+    """Premium clarity and color for a suggested stone"""
+    if stone_type == "diamond":
+        stone_clarity = rng.choice(DIAMOND_CLARITY_OPTIONS)
+        stone_color = "D" if rng.random() > 0.7 else rng.choice(["E", "F", "G"])
+        return stone_clarity, f"{stone_color} (Colorless)" if stone_color in ["D", "E", "F"] else f"{stone_color} (Near Colorless)"
+    
+    # Colored stones list their finest grades and colors first
+    details = catalog.details["stones"].get(stone_type, {})
+    stone_clarity = rng.choice(details.get("clarity_grades", ["eye-clean"])[:2])
+    stone_color = rng.choice(details.get("colors", ["natural"])[:2])
+    return stone_clarity, stone_color.title()
+
 def generate_premium_suggestions(story_analysis: StoryAnalysis, story_data: StoryData, 
-                               preferences: PremiumPreferences) -> List[PremiumDesign]:
+                               preferences: PremiumPreferences, count: int = 3,
+                               rng=random, snapshot: Optional["CatalogSnapshot"] = None,
+                               narrative: Tuple[str, ...] = NARRATIVE_FIELDS) -> List[PremiumDesign]:
     """Generate premium jewelry suggestions with story integration"""
+    return list(iter_premium_suggestions(story_analysis, story_data, preferences, count,
+                                         rng=rng, snapshot=snapshot, narrative=narrative))
+
+def iter_premium_suggestions(story_analysis: StoryAnalysis, story_data: StoryData,
+                             preferences: PremiumPreferences, count: int = 3,
+                             rng=random, snapshot: Optional["CatalogSnapshot"] = None,
+                             narrative: Tuple[str, ...] = NARRATIVE_FIELDS) -> Iterator[PremiumDesign]:
+    """Yield premium suggestions one at a time, each as soon as it is complete.
+
+    ``rng`` may be a seeded ``random.Random`` for reproducible designs.
+    Every design is drawn from one catalog ``snapshot`` (the current one
+    by default), even if a reload lands mid-request. With an inventory
+    loaded, the designs are its best-matching SKUs instead. Only the
+    ``narrative`` fields are rendered; the rest are left as None, and
+    the designs themselves do not depend on which were asked for.
+    """
     
-    suggestions = []
+    snapshot = snapshot or catalog_watcher.current
     
-    # Extract budget range
-    budget_ranges = {
-        "5000-10000": (5000, 10000),
-        "10000-20000": (10000, 20000),
-        "20000-50000": (20000, 50000),
-        "50000-100000": (50000, 100000),
-        "100000+": (100000, 500000),
-        "consultation": (20000, 100000)
-    }
+    # Time spent suspended between designs is not counted
+    resumed = time.perf_counter()
+    working_seconds = 0.0
+    narrative_seconds = 0.0
     
-    budget_min, budget_max = budget_ranges.get(preferences.budget_range, (10000, 30000))
+    budget = BUDGET_RANGES.get(preferences.budget_range, (10000, 30000))
     
-    # Generate 3 suggestions with different approaches
-    approaches = [
-        {"focus": "story_optimized", "carat_range": (0.8, 1.5), "premium_factor": 1.2},
-        {"focus": "balanced", "carat_range": (1.0, 2.0), "premium_factor": 1.0},
-        {"focus": "statement", "carat_range": (1.5, 3.0), "premium_factor": 1.1}
-    ]
+    # Select components based on story analysis
+    recommended_metals = story_analysis.recommended_elements.get("metals", ["white_gold"])
+    recommended_shapes = story_analysis.recommended_elements.get("shapes", ["round"])
+    metals = [preferences.metal_type] if preferences.metal_type else recommended_metals
+    stones = suggestion_stones(preferences, story_analysis, snapshot.catalog)
     
-    for i, approach in enumerate(approaches):
-        # Select components based on story analysis
-        recommended_metals = story_analysis.recommended_elements.get("metals", ["white_gold"])
-        recommended_shapes = story_analysis.recommended_elements.get("shapes", ["round"])
-        
-        metal_type = preferences.metal_type or random.choice(recommended_metals)
-        stone_shape = random.choice(recommended_shapes)
-        
-        # Adjust carat weight to fit budget
-        target_carat = random.uniform(*approach["carat_range"])
-        max_affordable_carat = (budget_max * 0.8) / (8000 * approach["premium_factor"])
-        carat_weight = min(target_carat, max_affordable_carat)
-        carat_weight = max(0.5, round(carat_weight, 2))
-        
-        # Premium clarity and color
-        clarity_options = ["FL", "IF", "VVS1", "VVS2", "VS1"]
-        stone_clarity = random.choice(clarity_options)
-        stone_color = "D" if random.random() > 0.7 else random.choice(["E", "F", "G"])
-        
-        # Setting based on style
-        setting_options = {
-            "vintage": ["vintage", "halo", "milgrain"],
-            "modern": ["prong", "bezel", "tension"],
-            "romantic": ["halo", "vintage", "pave"]
-        }
-        
-        primary_theme = story_analysis.themes[0] if story_analysis.themes else "classic"
-        available_settings = setting_options.get(primary_theme, ["prong", "halo"])
-        setting_type = random.choice(available_settings)
-        
-        # Calculate price
-        estimated_price = calculate_premium_price(
-            stone_shape, carat_weight, metal_type, 
-            setting_complexity=1.3, story_premium=True
-        )
-        
-        # Ensure within budget
-        if estimated_price > budget_max:
-            # Reduce carat weight to fit budget
-            target_carat = (budget_max * 0.9) / (8000 * approach["premium_factor"])
-            carat_weight = max(0.5, round(target_carat, 2))
-            estimated_price = calculate_premium_price(
-                stone_shape, carat_weight, metal_type, 
-                setting_complexity=1.3, story_premium=True
-            )
+    primary_theme = story_analysis.themes[0] if story_analysis.themes else "classic"
+    available_settings = SETTING_OPTIONS.get(primary_theme, ["prong", "halo"])
+    
+    if inventory is not None:
+        # Real SKUs, best match first
+        rows = inventory.top_k(count, story_analysis.themes, stones, recommended_shapes, metals, budget)
+        selections = [(SUGGESTION_APPROACHES[i % len(SUGGESTION_APPROACHES)], inventory.item(int(row)))
+                      for i, row in enumerate(rows)]
+    else:
+        # Draw every candidate for an approach from one budget-filtered pool
+        candidates = []
+        for i, approach in enumerate(SUGGESTION_APPROACHES):
+            per_approach = len(range(i, count, len(SUGGESTION_APPROACHES)))
+            if per_approach:
+                picks = snapshot.engine.sample(rng, stones, recommended_shapes, metals,
+                                             approach["carat_range"], budget, k=per_approach)
+                candidates.append((approach, iter(picks)))
+        selections = [(approach, next(picks)) for approach, picks in
+                      (candidates[i % len(candidates)] for i in range(count))]
+    
+    for approach, candidate in selections:
+        if isinstance(candidate, InventoryItem):
+            # A SKU's grades and setting are fixed
+            stone_clarity, stone_color, setting_type = candidate.stone_clarity, candidate.stone_color, candidate.setting_type
+        else:
+            # Premium clarity and color
+            stone_clarity, stone_color = stone_grades(candidate.stone_type, snapshot.catalog, rng)
+            
+            # Setting based on style
+            setting_type = rng.choice(available_settings)
         
         # Generate design
         design_dict = {
-            "stone_shape": stone_shape,
-            "stone_type": "diamond",
-            "metal_type": metal_type,
+            "stone_shape": candidate.stone_shape,
+            "stone_type": candidate.stone_type,
+            "metal_type": candidate.metal_type,
             "stone_clarity": stone_clarity,
-            "carat_weight": carat_weight,
+            "carat_weight": candidate.carat_weight,
             "stone_color": stone_color,
-            "setting_type": setting_type
+            "setting_type": setting_type,
+            "estimated_price": candidate.estimated_price
         }
+        # Same attributes, same ID, on every worker
+        design_id = candidate.sku if isinstance(candidate, InventoryItem) else design_key(design_dict)
+        
+        narrative_started = time.perf_counter()
+        rationale = (generate_premium_rationale(design_dict, approach["focus"], story_analysis)
+                     if "rationale" in narrative else None)
+        story_connection = generate_story_connection(design_dict, story_analysis, story_data, rng,
+                                                     render="story_connection" in narrative)
+        premium_features = (generate_premium_features(design_dict, story_analysis)
+                            if "premium_features" in narrative else None)
+        narrative_seconds += time.perf_counter() - narrative_started
         
         design = PremiumDesign(
-            id=f"lumiere_{random.randint(1000, 9999)}_{datetime.now().strftime('%H%M%S')}",
-            stone_type="diamond",
-            stone_shape=stone_shape,
-            stone_color=f"{stone_color} (Colorless)" if stone_color in ["D", "E", "F"] else f"{stone_color} (Near Colorless)",
+            id=design_id,
+            stone_type=candidate.stone_type,
+            stone_shape=candidate.stone_shape,
+            stone_color=stone_color,
             stone_clarity=stone_clarity,
-            carat_weight=carat_weight,
-            metal_type=metal_type,
+            carat_weight=candidate.carat_weight,
+            metal_type=candidate.metal_type,
             setting_type=setting_type,
-            estimated_price=estimated_price,
-            rationale=generate_premium_rationale(design_dict, approach["focus"], story_analysis),
-            story_connection=generate_story_connection(design_dict, story_analysis, story_data),
+            estimated_price=candidate.estimated_price,
+            rationale=rationale,
+            story_connection=story_connection,
             style_tags=story_analysis.themes[:2] + [approach["focus"]],
-            premium_features=generate_premium_features(design_dict, story_analysis)
+            premium_features=premium_features
         )
         
-        suggestions.append(design)
+        working_seconds += time.perf_counter() - resumed
+        yield design
+        resumed = time.perf_counter()
     
-    return suggestions
+    # Narrative text is timed apart from design selection
+    working_seconds += time.perf_counter() - resumed
+    observe_stage("narrative", narrative_seconds)
+    observe_stage("suggestions", working_seconds - narrative_seconds)
 
-def generate_premium_rationale(design: Dict, focus: str, story_analysis: StoryAnalysis) -> str:
-    """Generate sophisticated rationale for premium recommendations"""
+RATIONALE_TEMPLATES = {
+    "story_optimized": "This design harmoniously weaves your personal story into every detail. The {shape} cut and {metal} setting were specifically chosen to reflect the {themes} elements of your journey together.",
     
-    rationales = {
-        "story_optimized": f"This design harmoniously weaves your personal story into every detail. The {design['stone_shape']} cut and {design['metal_type'].replace('_', ' ')} setting were specifically chosen to reflect the {', '.join(story_analysis.themes[:2])} elements of your journey together.",
-        
-        "balanced": f"Representing the perfect balance of exceptional quality and meaningful design, this {design['carat_weight']}-carat {design['stone_shape']} diamond achieves optimal brilliance while honoring your style preferences. The {design['stone_clarity']} clarity ensures maximum light return.",
-        
-        "statement": f"For those moments when only the extraordinary will do, this magnificent {design['carat_weight']}-carat centerpiece commands attention while maintaining sophisticated elegance. The {design['metal_type'].replace('_', ' ')} setting provides the perfect stage for this remarkable diamond."
-    }
+    "balanced": "Representing the perfect balance of exceptional quality and meaningful design, this {carat}-carat {shape} {stone} achieves optimal brilliance while honoring your style preferences. The {clarity} clarity ensures maximum light return.",
     
-    base_rationale = rationales.get(focus, rationales["balanced"])
+    "statement": "For those moments when only the extraordinary will do, this magnificent {carat}-carat centerpiece commands attention while maintaining sophisticated elegance. The {metal} setting provides the perfect stage for this remarkable {stone}."
+}
+
+# Technical excellence note appended to every rationale
+TECHNICAL_NOTE_TEMPLATE = " Certified for exceptional cut quality and {clarity} clarity grade, this piece represents the pinnacle of {stone} craftsmanship."
+
+def generate_premium_rationale(design: Dict, focus: str, story_analysis: StoryAnalysis) -> str:
+    """Generate sophisticated rationale for premium recommendations; only the chosen template is rendered"""
     
-    # Add technical excellence note
-    technical_note = f" Certified for exceptional cut quality and {design['stone_clarity']} clarity grade, this piece represents the pinnacle of diamond craftsmanship."
+    stone = design.get("stone_type", "diamond")
+    template = RATIONALE_TEMPLATES.get(focus, RATIONALE_TEMPLATES["balanced"])
     
-    return base_rationale + technical_note
+    return (template + TECHNICAL_NOTE_TEMPLATE).format(
+        stone=stone,
+        shape=design["stone_shape"],
+        metal=design["metal_type"].replace("_", " "),
+        carat=design["carat_weight"],
+        clarity=design["stone_clarity"],
+        themes=", ".join(story_analysis.themes[:2])
+    )
 
 def generate_premium_features(design: Dict, story_analysis: StoryAnalysis) -> List[str]:
     """Generate list of premium features for the design"""
     
     features = [
-        "GIA Certified Diamond",
+        f"GIA Certified {design.get('stone_type', 'diamond').title()}",
         "Premium Cut Grade: Excellent",
         "Conflict-Free Sourcing Guarantee",
         "Lifetime Warranty & Service",
@@ -420,170 +619,861 @@ def generate_premium_features(design: Dict, story_analysis: StoryAnalysis) -> Li
     
     return features[:5]  # Return top 5 features
 
-# API Routes
-@app.get("/")
-async def serve_frontend():
-    return FileResponse("static/index.html")
+@pipeline("story")
+def build_story_recommendations(request: StoryRecommendationRequest, rng=random,
+                                catalog_version: Optional[str] = None,
+                                narrative: Tuple[str, ...] = NARRATIVE_FIELDS):
+    """Run the story pipeline; returns the session record and the response body.
 
-@app.post("/api/story-recommendations")
-async def create_story_recommendations(request: StoryRecommendationRequest):
-    """Generate recommendations based on customer story and preferences"""
+    Kept free of session and request state so batch jobs can run it in a
+    worker process. ``catalog_version`` pins the catalog the caller saw,
+    so a worker that has not reloaded yet prices with the same data.
+    Only the ``narrative`` text fields are rendered.
+    """
     
-    session_id = f"lumiere_{random.randint(10000, 99999)}"
+    snapshot = catalog_watcher.get(catalog_version)
     
-    try:
-        # Analyze the story
+    # Analyze the story
+    with stage("analysis"):
         story_analysis = analyze_story_text(request.story)
-        
-        # Generate premium suggestions
-        suggestions = generate_premium_suggestions(story_analysis, request.story, request.preferences)
-        
-        # Create story insights
-        story_insights = {
+    
+    # Generate premium suggestions
+    suggestions = generate_premium_suggestions(story_analysis, request.story, request.preferences,
+                                               rng=rng, snapshot=snapshot, narrative=narrative)
+    
+    stage_started = time.perf_counter()
+    # Serialized once and shared by the session record and the response
+    suggestion_data = [s.model_dump() for s in suggestions]
+    session_record = story_session_record(request, story_analysis, suggestion_data)
+    response = {
+        "suggestions": suggestion_data,
+        **story_summary(story_analysis),
+        "catalog_version": snapshot.version
+    }
+    observe_stage("serialization", time.perf_counter() - stage_started)
+    
+    return session_record, response
+
+def iter_story_recommendations(request: StoryRecommendationRequest, rng=random,
+                               catalog_version: Optional[str] = None,
+                               narrative: Tuple[str, ...] = NARRATIVE_FIELDS, count: int = 3):
+    """Run the story pipeline as a sequence of ``(event, data)`` pairs, for streaming.
+
+    ``insights`` comes as soon as the story is analyzed, then one
+    ``suggestion`` per design as it is generated, and last ``result``
+    with the session record and response body. For three suggestions
+    and the same generator, these are what ``build_story_recommendations``
+    returns.
+    """
+    
+    snapshot = catalog_watcher.get(catalog_version)
+    
+    with stage("analysis"):
+        story_analysis = analyze_story_text(request.story)
+    summary = story_summary(story_analysis, count)
+    yield "insights", {**summary, "catalog_version": snapshot.version}
+    
+    serialization_seconds = 0.0
+    suggestion_data = []
+    for design in iter_premium_suggestions(story_analysis, request.story, request.preferences, count,
+                                           rng=rng, snapshot=snapshot, narrative=narrative):
+        stage_started = time.perf_counter()
+        data = design.model_dump()
+        suggestion_data.append(data)
+        serialization_seconds += time.perf_counter() - stage_started
+        yield "suggestion", data
+    
+    observe_stage("serialization", serialization_seconds)
+    response = {"suggestions": suggestion_data, **summary, "catalog_version": snapshot.version}
+    yield "result", (story_session_record(request, story_analysis, suggestion_data), response)
+
+NUMBER_WORDS = ("no", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+                "eleven", "twelve")
+
+def story_summary(story_analysis: StoryAnalysis, count: int = 3) -> Dict:
+    """Response fields that depend only on the story analysis and how many designs it introduces"""
+    
+    number = NUMBER_WORDS[count] if count < len(NUMBER_WORDS) else str(count)
+    themes = ', '.join(story_analysis.themes[:2])
+    if count == 1:
+        crafted = f"one exceptional piece that captures the essence of your journey. It reflects the {themes}"
+    else:
+        crafted = f"{number} exceptional pieces that capture the essence of your journey. Each design reflects the {themes}"
+    message = f"Based on your beautiful love story, we've crafted {crafted} elements that make your relationship unique."
+    
+    # Create story insights
+    story_insights = {
+        "themes": story_analysis.themes,
+        "style_match": f"{story_analysis.themes[0].title()} Romance" if story_analysis.themes else "Classic Elegance",
+        "emotional_connection": len(story_analysis.emotional_keywords),
+        "personalization_level": "High"
+    }
+    
+    return {
+        "message": message,
+        "story_insights": story_insights,
+        "personalization_score": min(100, len(story_analysis.themes) * 25 + len(story_analysis.emotional_keywords) * 10)
+    }
+
+def story_session_record(request: StoryRecommendationRequest, story_analysis: StoryAnalysis,
+                         suggestion_data: List[Dict]) -> Dict:
+    return {
+        "story": request.story.model_dump(),
+        "preferences": request.preferences.model_dump(),
+        "story_analysis": {
             "themes": story_analysis.themes,
-            "style_match": f"{story_analysis.themes[0].title()} Romance" if story_analysis.themes else "Classic Elegance",
-            "emotional_connection": len(story_analysis.emotional_keywords),
-            "personalization_level": "High"
+            "style_indicators": story_analysis.style_indicators,
+            "personality_traits": story_analysis.personality_traits
+        },
+        "suggestions": suggestion_data,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@pipeline("preferences")
+def build_preference_recommendations(preferences: PremiumPreferences, rng=random,
+                                     catalog_version: Optional[str] = None,
+                                     narrative: Tuple[str, ...] = NARRATIVE_FIELDS):
+    """Run the preference-only pipeline; returns the session record and the response body"""
+    
+    snapshot = catalog_watcher.get(catalog_version)
+    
+    # Create default story analysis for preference-based recommendations
+    default_analysis = StoryAnalysis(
+        themes=["classic"],
+        style_indicators=["elegant"],
+        personality_traits=[],
+        emotional_keywords=[],
+        recommended_elements={
+            "metals": ["white_gold", "platinum"],
+            "shapes": ["round", "oval", "princess"]
         }
-        
-        # Store in session
-        story_sessions[session_id] = {
-            "story": request.story.dict(),
-            "preferences": request.preferences.dict(),
-            "story_analysis": {
-                "themes": story_analysis.themes,
-                "style_indicators": story_analysis.style_indicators,
-                "personality_traits": story_analysis.personality_traits
-            },
-            "suggestions": [s.dict() for s in suggestions],
+    )
+    
+    # Create minimal story data
+    default_story = StoryData()
+    
+    suggestions = generate_premium_suggestions(default_analysis, default_story, preferences,
+                                               rng=rng, snapshot=snapshot, narrative=narrative)
+    
+    with stage("serialization"):
+        suggestion_data = [s.model_dump() for s in suggestions]
+        session_record = {
+            "preferences": preferences.model_dump(),
+            "suggestions": suggestion_data,
             "timestamp": datetime.now().isoformat()
         }
         
-        message = f"Based on your beautiful love story, we've crafted three exceptional pieces that capture the essence of your journey. Each design reflects the {', '.join(story_analysis.themes[:2])} elements that make your relationship unique."
-        
-        return {
-            "session_id": session_id,
-            "suggestions": [s.dict() for s in suggestions],
-            "message": message,
-            "story_insights": story_insights,
-            "personalization_score": min(100, len(story_analysis.themes) * 25 + len(story_analysis.emotional_keywords) * 10)
+        response = {
+            "suggestions": suggestion_data,
+            "message": "Here are three exceptional pieces selected based on your preferences, each representing the pinnacle of diamond craftsmanship.",
+            "catalog_version": snapshot.version
+        }
+    
+    return session_record, response
+
+@pipeline("upload")
+def build_image_recommendations(style_counts: Dict[str, int], confidence: float, rng=random,
+                                catalog_version: Optional[str] = None,
+                                narrative: Tuple[str, ...] = NARRATIVE_FIELDS):
+    """Run the image-inspired pipeline; returns the session record and the response body"""
+    
+    snapshot = catalog_watcher.get(catalog_version)
+    
+    # Get most common styles
+    top_styles = sorted(style_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+    primary_themes = [style for style, count in top_styles]
+    
+    # Create analysis based on detected styles
+    image_analysis = StoryAnalysis(
+        themes=primary_themes,
+        style_indicators=primary_themes,
+        personality_traits=[],
+        emotional_keywords=[],
+        recommended_elements={
+            "metals": ["rose_gold", "white_gold"] if "romantic" in primary_themes else ["platinum", "white_gold"],
+            "shapes": ["round", "cushion"] if "vintage" in primary_themes else ["round", "princess"]
         }
+    )
+    
+    # Create preferences from image analysis
+    preferences = PremiumPreferences(
+        ring_type="engagement",
+        metal_type=rng.choice(image_analysis.recommended_elements["metals"]),
+        design_inspiration=f"Inspired by {', '.join(primary_themes)} visual elements"
+    )
+    
+    suggestions = generate_premium_suggestions(image_analysis, StoryData(), preferences,
+                                               rng=rng, snapshot=snapshot, narrative=narrative)
+    
+    stage_started = time.perf_counter()
+    suggestion_data = [s.model_dump() for s in suggestions]
+    session_record = {
+        "image_analysis": {
+            "detected_styles": primary_themes,
+            "confidence": confidence,
+            "style_distribution": style_counts
+        },
+        "suggestions": suggestion_data,
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    response = {
+        "suggestions": suggestion_data,
+        "message": f"Your visual inspiration reveals {', '.join(primary_themes)} design preferences. Here are three pieces that capture those aesthetic elements.",
+        "image_analysis": {
+            "detected_styles": primary_themes,
+            "confidence": confidence
+        },
+        "catalog_version": snapshot.version
+    }
+    observe_stage("serialization", time.perf_counter() - stage_started)
+    
+    return session_record, response
+
+# Similar-design search over the inventory and every design served since startup
+similar_designs = SimilarDesigns(
+    DesignEncoder(catalog_watcher.current.catalog, SIMILARITY_TAGS),
+    inventory,
+    capacity=int(os.environ.get("LUMIERE_SIMILAR_CAPACITY", "100000")),
+    nprobe=int(os.environ.get("LUMIERE_SIMILAR_NPROBE", "8"))
+)
+
+# Attributes of every design served by this worker, stored once and resolved by ID
+design_registry = DesignRegistry(
+    max_entries=int(os.environ.get("LUMIERE_DESIGN_REGISTRY_MAX", "100000"))
+)
+
+def publish_designs(suggestions: List[Dict], endpoint: str):
+    """Register served designs and make them available to the similar-designs endpoint.
+
+    Runs in the serving process, so designs built in worker processes
+    are registered where shortlists resolve them.
+    """
+    with stage("design_registry", endpoint):
+        design_registry.register(suggestions)
+    with stage("similar_index", endpoint):
+        similar_designs.add(suggestions)
+
+# Pipeline execution off the event loop
+pipeline_executor = BoundedExecutor(
+    kind=os.environ.get("LUMIERE_EXECUTOR", "thread"),
+    max_workers=int(os.environ.get("LUMIERE_EXECUTOR_WORKERS", str(os.cpu_count() or 1))),
+    max_in_flight=int(os.environ.get("LUMIERE_MAX_IN_FLIGHT", str(os.cpu_count() or 1))),
+    max_queue=int(os.environ.get("LUMIERE_MAX_QUEUE", "64")),
+    queue_timeout=float(os.environ.get("LUMIERE_QUEUE_TIMEOUT_SECONDS", "2"))
+)
+
+async def run_pipeline(func, *args, **kwargs):
+    """Run ``func`` on the pipeline executor, keeping stage timings from worker processes"""
+    if pipeline_executor.kind != "process":
+        return await pipeline_executor.run(func, *args, **kwargs)
+    result, timings = await pipeline_executor.run(collect_stages, func, *args, **kwargs)
+    replay_stages(timings)
+    return result
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# Deterministic generation and result caching
+DETERMINISTIC_MODE = os.environ.get("LUMIERE_DETERMINISTIC", "1") == "1"
+
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.environ.get("LUMIERE_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(os.environ.get("LUMIERE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl_seconds=float(os.environ.get("LUMIERE_CACHE_TTL_SECONDS", "3600"))
+)
+
+def new_session_id() -> str:
+    """Unguessable session id; sessions are only ever looked up by it"""
+    return f"lumiere_{secrets.token_urlsafe(12)}"
+
+def fresh_session_record(session_record: Dict) -> Dict:
+    """Copy a cached session record so session edits never reach the cache"""
+    return {**session_record, "timestamp": datetime.now().isoformat()}
+
+# Sparse fieldsets
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Validate a comma-separated ``fields=`` selector; None selects every field"""
+    if fields is None:
+        return None
+    selected = tuple(sorted({name.strip() for name in fields.split(",") if name.strip()}))
+    unknown = [name for name in selected if name not in PremiumDesign.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+def narrative_fields(fields: Optional[Tuple[str, ...]]) -> Tuple[str, ...]:
+    """Text fields a response needs rendered"""
+    if fields is None:
+        return NARRATIVE_FIELDS
+    return tuple(name for name in NARRATIVE_FIELDS if name in fields)
+
+def result_key(fingerprint: str, narrative: Tuple[str, ...]) -> str:
+    """Cache key for a result rendered with only the ``narrative`` fields"""
+    if narrative == NARRATIVE_FIELDS:
+        return fingerprint
+    return f"{fingerprint}:{','.join(narrative)}"
+
+def trim_suggestion(suggestion: Dict, fields: Optional[Tuple[str, ...]]) -> Dict:
+    """Suggestion cut down to its id and ``fields``"""
+    if fields is None:
+        return suggestion
+    return {"id": suggestion["id"], **{name: suggestion[name] for name in fields}}
+
+def select_fields(response: Dict, fields: Optional[Tuple[str, ...]]) -> Dict:
+    """Response body with each suggestion cut down to its id and ``fields``"""
+    if fields is None:
+        return response
+    return {**response, "suggestions": [trim_suggestion(suggestion, fields)
+                                        for suggestion in response["suggestions"]]}
+
+async def run_cached(kind: str, inputs: List[BaseModel], build,
+                     fields: Optional[Tuple[str, ...]] = None):
+    """Run ``build(rng, catalog_version, narrative)`` on the pipeline executor, through the result cache.
+
+    In deterministic mode the generator is seeded from the request
+    fingerprint, so a cache miss and a later hit return the same designs.
+    The catalog version is part of the fingerprint, so a reload never
+    serves designs priced from the previous catalog. The field selection
+    is not: it changes what is rendered and cached, never which designs
+    are chosen.
+    
+    If the pinned catalog is retired before the pipeline reads it, the
+    request runs once more, fingerprinted and cached under the current
+    version.
+    """
+    narrative = narrative_fields(fields)
+    
+    async def attempt(version: str):
+        if not DETERMINISTIC_MODE:
+            return await run_pipeline(build, catalog_version=version, narrative=narrative)
+        
+        fingerprint = request_fingerprint(kind, version, *inputs)
+        key = result_key(fingerprint, narrative)
+        cached = recommendation_cache.get(key)
+        if cached is None:
+            session_record, response = await run_pipeline(build, rng=seeded_rng(fingerprint),
+                                                          catalog_version=version, narrative=narrative)
+            cached = {"session_record": session_record, "response": response}
+            recommendation_cache.set(key, cached)
+        return fresh_session_record(cached["session_record"]), cached["response"]
+    
+    try:
+        return await attempt(catalog_watcher.current.version)
+    except CatalogVersionUnavailable:
+        return await attempt(catalog_watcher.current.version)
+
+# Batch processing
+BATCH_WORKERS = int(os.environ.get("LUMIERE_BATCH_WORKERS", str(os.cpu_count() or 1)))
+BATCH_MAX_IN_FLIGHT = int(os.environ.get("LUMIERE_BATCH_MAX_IN_FLIGHT", str(BATCH_WORKERS * 4)))
+
+_batch_pool = None
+
+def get_batch_pool() -> ProcessPoolExecutor:
+    """Worker pool for batch jobs, created on first use"""
+    global _batch_pool
+    if _batch_pool is None:
+        _batch_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+    return _batch_pool
+
+def discard_batch_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so later items and batches start a fresh one"""
+    global _batch_pool
+    if _batch_pool is pool:
+        _batch_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+class RequestBodyStreamingResponse(StreamingResponse):
+    """Streaming response that may keep reading the request body.
+
+    StreamingResponse listens for client disconnects on ``receive``, which
+    would swallow body chunks still being read by the content iterator.
+    Disconnects surface through the body stream while it is read, and
+    through ``stream_batch_results`` polling the request after that.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def iter_ndjson_body(request: Request):
+    """Yield parsed items from an NDJSON request body as it arrives"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+async def iter_list_body(items: list):
+    for item in items:
+        yield item
+
+def parse_batch_item(item) -> StoryRecommendationRequest:
+    """Validate one batch item; raw NDJSON lines are parsed here"""
+    if isinstance(item, bytes):
+        return StoryRecommendationRequest.model_validate_json(item)
+    return StoryRecommendationRequest.model_validate(item)
+
+def batch_result_line(index: int, session_record: Dict, response: Dict,
+                      fields: Optional[Tuple[str, ...]] = None) -> bytes:
+    session_id = new_session_id()
+    with stage("session_store", "batch"):
+        story_sessions.set(session_id, session_record)
+    publish_designs(response["suggestions"], "batch")
+    with stage("serialization", "batch"):
+        return orjson.dumps({"index": index, "status": "ok", "session_id": session_id,
+                             **select_fields(response, fields)}) + b"\n"
+
+def batch_error_line(index: int, error: Exception) -> bytes:
+    return orjson.dumps({"index": index, "status": "error", "error": str(error)}) + b"\n"
+
+async def stream_batch_results(items, fields: Optional[Tuple[str, ...]] = None,
+                               request: Optional[Request] = None, body_read: bool = False):
+    """Run batch items on the worker pool and yield one NDJSON line per result.
+
+    Items are validated and looked up in the result cache here; only
+    misses are sent to the pool. At most BATCH_MAX_IN_FLIGHT items are
+    read ahead of the output, so memory stays flat regardless of the
+    batch size.
+    
+    Once the body is fully read (``body_read``, or ``items`` has run out)
+    ``request`` is checked for a disconnect between results, and a client
+    that has gone stops the batch; polling earlier would consume body
+    chunks. Work not yet started is cancelled whenever the stream ends.
+    A broken pool is replaced, failing only the items it held.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_batch_pool()
+    narrative = narrative_fields(fields)
+    in_flight = {}
+    index = 0
+    exhausted = False
+    
+    def submit(build):
+        nonlocal pool
+        try:
+            return loop.run_in_executor(pool, collect_stages, build)
+        except BrokenProcessPool:
+            discard_batch_pool(pool)
+            pool = get_batch_pool()
+            return loop.run_in_executor(pool, collect_stages, build)
+    
+    try:
+        while True:
+            if request is not None and (body_read or exhausted) and await request.is_disconnected():
+                logger.info("Batch client disconnected after %d items; cancelling %d in flight",
+                            index, len(in_flight))
+                return
+            
+            while not exhausted and len(in_flight) < BATCH_MAX_IN_FLIGHT:
+                try:
+                    item = await items.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                item_index, index = index, index + 1
+                
+                try:
+                    request_item = parse_batch_item(item)
+                except ValidationError as e:
+                    yield batch_error_line(item_index, e)
+                    continue
+                
+                version = catalog_watcher.current.version
+                if not DETERMINISTIC_MODE:
+                    build, key = partial(build_story_recommendations, request_item, catalog_version=version,
+                                         narrative=narrative), None
+                else:
+                    fingerprint = request_fingerprint("story", version, request_item.story, request_item.preferences)
+                    key = result_key(fingerprint, narrative)
+                    cached = recommendation_cache.get(key)
+                    if cached is not None:
+                        yield batch_result_line(item_index, fresh_session_record(cached["session_record"]),
+                                                cached["response"], fields)
+                        continue
+                    build = partial(build_story_recommendations, request_item, rng=seeded_rng(fingerprint),
+                                    catalog_version=version, narrative=narrative)
+                
+                in_flight[submit(build)] = (item_index, key)
+            
+            if not in_flight:
+                break
+            
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                item_index, key = in_flight.pop(future)
+                try:
+                    (session_record, response), timings = future.result()
+                except BrokenProcessPool as e:
+                    logger.error("Batch worker pool broke; starting a new one")
+                    discard_batch_pool(pool)
+                    pool = get_batch_pool()
+                    yield batch_error_line(item_index, e)
+                    continue
+                except Exception as e:
+                    yield batch_error_line(item_index, e)
+                    continue
+                replay_stages(timings)
+                if key is not None:
+                    recommendation_cache.set(key, {"session_record": session_record, "response": response})
+                    session_record = fresh_session_record(session_record)
+                yield batch_result_line(item_index, session_record, response, fields)
+    finally:
+        # Queued items never start; items already running finish unobserved
+        for future in in_flight:
+            future.cancel()
+
+# Image analysis
+IMAGE_WORKERS = int(os.environ.get("LUMIERE_IMAGE_WORKERS", str(os.cpu_count() or 1)))
+IMAGE_TIMEOUT_SECONDS = float(os.environ.get("LUMIERE_IMAGE_TIMEOUT_SECONDS", "5"))
+IMAGE_MAX_BYTES = int(os.environ.get("LUMIERE_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+_image_pool = None
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Worker pool for image decoding and analysis, created on first use"""
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _image_pool
+
+def discard_image_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next upload starts a fresh one"""
+    global _image_pool
+    if _image_pool is pool:
+        _image_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+IMAGE_FAILURES = REGISTRY.counter(
+    "lumiere_image_failures_total", "Uploads that could not be analyzed, by reason", ("reason",)
+)
+
+image_cache = PerceptualHashCache(
+    max_entries=int(os.environ.get("LUMIERE_IMAGE_CACHE_ENTRIES", "4096")),
+    max_distance=int(os.environ.get("LUMIERE_IMAGE_HASH_DISTANCE", "6")),
+    color_tolerance=int(os.environ.get("LUMIERE_IMAGE_COLOR_TOLERANCE", "24"))
+)
+
+async def analyze_upload(file: UploadFile) -> Optional[Dict]:
+    """Analyze one upload off the event loop; None if it cannot be decoded in time.
+
+    Exact re-uploads are answered from the byte digest without decoding.
+    Anything else is signed in a worker from a cheap draft decode, and a
+    cached near-duplicate answers it without running the analysis, so
+    equivalent images get the same answer. Only a miss is decoded at
+    analysis size.
+    
+    Uploads over ``IMAGE_MAX_BYTES`` are refused while reading, and images
+    with too many pixels inside the worker before decoding, which bounds
+    how long a timed-out job can keep its worker busy. Timeouts, oversized
+    and undecodable images and a broken pool are logged and counted apart;
+    anything else is a bug and propagates.
+    """
+    try:
+        digest, data = await read_upload(file, max_bytes=IMAGE_MAX_BYTES)
+    except UploadTooLarge as e:
+        IMAGE_FAILURES.inc("too_large")
+        logger.info("Refused upload %r: %s", file.filename, e)
+        return None
+    cached = image_cache.lookup_digest(digest)
+    if cached is not None:
+        return cached
+    
+    loop = asyncio.get_running_loop()
+    pool = get_image_pool()
+    try:
+        signature = await asyncio.wait_for(
+            loop.run_in_executor(pool, sign_image, data),
+            timeout=IMAGE_TIMEOUT_SECONDS
+        )
+        cached = image_cache.lookup_signature(digest, signature)
+        if cached is not None:
+            return cached
+        result = await asyncio.wait_for(
+            loop.run_in_executor(pool, analyze_image, data),
+            timeout=IMAGE_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        IMAGE_FAILURES.inc("timeout")
+        logger.warning("Analysis of upload %r timed out after %.1fs", file.filename, IMAGE_TIMEOUT_SECONDS)
+        return None
+    except BrokenProcessPool:
+        IMAGE_FAILURES.inc("pool_broken")
+        logger.error("Image worker pool broke while analyzing %r; starting a new one", file.filename)
+        discard_image_pool(pool)
+        return None
+    except ImageTooLarge as e:
+        IMAGE_FAILURES.inc("too_large")
+        logger.info("Refused upload %r: %s", file.filename, e)
+        return None
+    except (OSError, ValueError) as e:
+        # Unidentified or truncated images
+        IMAGE_FAILURES.inc("undecodable")
+        logger.info("Could not decode upload %r: %s", file.filename, e)
+        return None
+    
+    return image_cache.store(digest, signature, result)
+
+# API Routes
+@app.api_route("/", methods=["GET", "HEAD"])
+async def serve_frontend(request: Request):
+    return static_assets.response("index.html", request.headers, request.method)
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def serve_static(path: str, request: Request):
+    return static_assets.response(path, request.headers, request.method)
+
+@app.post("/api/story-recommendations")
+async def create_story_recommendations(request: StoryRecommendationRequest, fields: Optional[str] = None):
+    """Generate recommendations based on customer story and preferences.
+
+    ``fields`` (comma-separated) limits each suggestion to those fields
+    plus ``id``; text fields that are left out are never rendered.
+    """
+    
+    session_id = new_session_id()
+    selected = parse_fields(fields)
+    
+    try:
+        session_record, response = await run_cached(
+            "story", [request.story, request.preferences],
+            partial(build_story_recommendations, request), selected
+        )
+        
+        # Store in session
+        with stage("session_store", "story"):
+            story_sessions.set(session_id, session_record)
+        publish_designs(response["suggestions"], "story")
+        
+        with stage("encoding", "story"):
+            return ORJSONResponse({"session_id": session_id, **select_fields(response, selected)})
         
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating story recommendations: {str(e)}")
+
+@app.post("/api/story-recommendations/batch")
+async def create_story_recommendations_batch(request: Request, fields: Optional[str] = None):
+    """Generate story recommendations for many requests, streamed as NDJSON.
+
+    Accepts a JSON array of story requests, or an ``application/x-ndjson``
+    body with one request per line, which is read incrementally. Each
+    input produces one output line, in completion order, tagged with its
+    ``index``; invalid or failing items are reported inline. ``fields``
+    applies to every line.
+    """
+    
+    selected = parse_fields(fields)
+    streamed_body = "ndjson" in request.headers.get("content-type", "")
+    if streamed_body:
+        items = iter_ndjson_body(request)
+    else:
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+        items = iter_list_body(payload)
+    
+    return RequestBodyStreamingResponse(
+        stream_batch_results(items, selected, request=request, body_read=not streamed_body),
+        media_type="application/x-ndjson"
+    )
+
+# Streamed story recommendations
+STREAM_MAX_SUGGESTIONS = int(os.environ.get("LUMIERE_STREAM_MAX_SUGGESTIONS", "24"))
+
+def stream_event(event: str, data: Dict, ndjson: bool) -> bytes:
+    """One event as a server-sent event or an NDJSON line"""
+    if ndjson:
+        return orjson.dumps({"event": event, "data": data}) + b"\n"
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+async def replay_story_events(cached: Dict):
+    """A cached story result as the events ``iter_story_recommendations`` yields"""
+    response = cached["response"]
+    yield "insights", {name: response[name] for name in
+                       ("message", "story_insights", "personalization_score", "catalog_version")}
+    for suggestion in response["suggestions"]:
+        yield "suggestion", suggestion
+    yield "result", (fresh_session_record(cached["session_record"]), response)
+
+@app.post("/api/story-recommendations/stream")
+async def stream_story_recommendations(request: StoryRecommendationRequest, http_request: Request,
+                                       count: int = 3, fields: Optional[str] = None):
+    """Story recommendations streamed as they are generated.
+
+    Sends ``insights`` once the story is analyzed, one ``suggestion`` per
+    design, then a ``summary`` with the session ID; a failure after the
+    first event is sent as an ``error`` event. Server-sent events by
+    default, NDJSON when the client accepts ``application/x-ndjson``.
+    Three suggestions are the same designs as the non-streaming endpoint
+    and share its result cache.
+    """
+    
+    if not 1 <= count <= STREAM_MAX_SUGGESTIONS:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {STREAM_MAX_SUGGESTIONS}")
+    selected = parse_fields(fields)
+    ndjson = "ndjson" in http_request.headers.get("accept", "")
+    session_id = new_session_id()
+    
+    version = catalog_watcher.current.version
+    narrative = narrative_fields(selected)
+    fingerprint = request_fingerprint("story", version, request.story, request.preferences)
+    key = result_key(fingerprint, narrative) if DETERMINISTIC_MODE and count == 3 else None
+    cached = recommendation_cache.get(key) if key else None
+    
+    if cached is not None:
+        events = replay_story_events(cached)
+    else:
+        events = pipeline_executor.stream(
+            iter_story_recommendations, request,
+            rng=seeded_rng(fingerprint) if DETERMINISTIC_MODE else random,
+            catalog_version=version, narrative=narrative, count=count,
+            context=pipeline_context("stream")
+        )
+    
+    # Admission and story analysis finish before the response starts, so
+    # overload and bad input still get a proper status code
+    try:
+        first = await events.__anext__()
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating story recommendations: {str(e)}")
+    
+    async def body():
+        event, data = first
+        yield stream_event(event, data, ndjson)
+        try:
+            async for event, data in events:
+                if event == "suggestion":
+                    yield stream_event(event, trim_suggestion(data, selected), ndjson)
+                    continue
+                
+                session_record, response = data
+                if key and cached is None:
+                    recommendation_cache.set(key, {"session_record": session_record, "response": response})
+                with stage("session_store", "stream"):
+                    story_sessions.set(session_id, session_record)
+                publish_designs(response["suggestions"], "stream")
+                yield stream_event("summary", {
+                    "session_id": session_id,
+                    "count": len(response["suggestions"]),
+                    "catalog_version": response["catalog_version"]
+                }, ndjson)
+        except Exception as e:
+            yield stream_event("error", {"detail": f"Error creating story recommendations: {str(e)}"}, ndjson)
+    
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/preferences")
-async def collect_preferences(preferences: PremiumPreferences):
+async def collect_preferences(preferences: PremiumPreferences, fields: Optional[str] = None):
     """Generate recommendations based on preferences only"""
     
-    session_id = f"lumiere_{random.randint(10000, 99999)}"
+    session_id = new_session_id()
+    selected = parse_fields(fields)
     
     try:
-        # Create default story analysis for preference-based recommendations
-        default_analysis = StoryAnalysis(
-            themes=["classic"],
-            style_indicators=["elegant"],
-            personality_traits=[],
-            emotional_keywords=[],
-            recommended_elements={
-                "metals": ["white_gold", "platinum"],
-                "shapes": ["round", "oval", "princess"]
-            }
+        session_record, response = await run_cached(
+            "preferences", [preferences],
+            partial(build_preference_recommendations, preferences), selected
         )
         
-        # Create minimal story data
-        default_story = StoryData()
-        
-        suggestions = generate_premium_suggestions(default_analysis, default_story, preferences)
-        
-        user_sessions[session_id] = {
-            "preferences": preferences.dict(),
-            "suggestions": [s.dict() for s in suggestions],
-            "timestamp": datetime.now().isoformat()
-        }
+        with stage("session_store", "preferences"):
+            user_sessions.set(session_id, session_record)
+        publish_designs(response["suggestions"], "preferences")
         
-        return {
-            "session_id": session_id,
-            "suggestions": [s.dict() for s in suggestions],
-            "message": "Here are three exceptional pieces selected based on your preferences, each representing the pinnacle of diamond craftsmanship."
-        }
+        with stage("encoding", "preferences"):
+            return ORJSONResponse({"session_id": session_id, **select_fields(response, selected)})
         
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
 
 @app.post("/api/upload-images")
-async def upload_images(files: List[UploadFile] = File(...)):
+async def upload_images(files: List[UploadFile] = File(...), fields: Optional[str] = None):
     """Handle multiple image uploads for style analysis"""
     
-    session_id = f"lumiere_{random.randint(10000, 99999)}"
+    session_id = new_session_id()
+    selected = parse_fields(fields)
+    
+    # Analyze every image concurrently in the image worker pool
+    image_files = [file for file in files if (file.content_type or "").startswith("image/")]
+    results = await asyncio.gather(*(analyze_upload(file) for file in image_files))
+    results = [result for result in results if result is not None]
+    
+    if not results:
+        raise HTTPException(status_code=400, detail="No images could be analyzed")
     
     try:
-        # Mock image analysis for multiple images
         detected_styles = []
         confidence_scores = []
         
-        for file in files:
-            if not file.content_type.startswith("image/"):
-                continue
-                
-            # Simulate advanced image analysis
-            styles = random.sample(["vintage", "modern", "romantic", "minimalist", "bohemian"], k=2)
-            detected_styles.extend(styles)
-            confidence_scores.append(random.uniform(0.75, 0.95))
+        for result in results:
+            detected_styles.extend(result["styles"])
+            confidence_scores.append(result["confidence"])
         
         # Aggregate analysis results
         style_counts = {}
         for style in detected_styles:
             style_counts[style] = style_counts.get(style, 0) + 1
         
-        # Get most common styles
-        top_styles = sorted(style_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-        primary_themes = [style for style, count in top_styles]
-        
-        # Create analysis based on detected styles
-        image_analysis = StoryAnalysis(
-            themes=primary_themes,
-            style_indicators=primary_themes,
-            personality_traits=[],
-            emotional_keywords=[],
-            recommended_elements={
-                "metals": ["rose_gold", "white_gold"] if "romantic" in primary_themes else ["platinum", "white_gold"],
-                "shapes": ["round", "cushion"] if "vintage" in primary_themes else ["round", "princess"]
-            }
+        session_record, response = await run_pipeline(
+            build_image_recommendations, style_counts, sum(confidence_scores) / len(confidence_scores),
+            catalog_version=catalog_watcher.current.version, narrative=narrative_fields(selected)
         )
         
-        # Create preferences from image analysis
-        preferences = PremiumPreferences(
-            ring_type="engagement",
-            metal_type=random.choice(image_analysis.recommended_elements["metals"]),
-            design_inspiration=f"Inspired by {', '.join(primary_themes)} visual elements"
-        )
+        with stage("session_store", "upload"):
+            user_sessions.set(session_id, session_record)
+        publish_designs(response["suggestions"], "upload")
         
-        suggestions = generate_premium_suggestions(image_analysis, StoryData(), preferences)
-        
-        user_sessions[session_id] = {
-            "image_analysis": {
-                "detected_styles": primary_themes,
-                "confidence": sum(confidence_scores) / len(confidence_scores),
-                "style_distribution": style_counts
-            },
-            "suggestions": [s.dict() for s in suggestions],
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        return {
-            "session_id": session_id,
-            "suggestions": [s.dict() for s in suggestions],
-            "message": f"Your visual inspiration reveals {', '.join(primary_themes)} design preferences. Here are three pieces that capture those aesthetic elements.",
-            "image_analysis": {
-                "detected_styles": primary_themes,
-                "confidence": sum(confidence_scores) / len(confidence_scores)
-            }
-        }
+        with stage("encoding", "upload"):
+            return ORJSONResponse({"session_id": session_id, **select_fields(response, selected)})
         
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing images: {str(e)}")
 
+@app.get("/api/designs/{design_id}/similar")
+def get_similar_designs(design_id: str, k: int = 6):
+    """Designs most like one already shown, from the inventory and recent suggestions"""
+    if not 1 <= k <= 50:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 50")
+    similar = similar_designs.similar(design_id, k)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Design not found")
+    return ORJSONResponse({"design_id": design_id, "similar": similar})
+
+def find_session(session_id: str):
+    """Session record and the store holding it.
+
+    Sessions may have been created by another worker sharing the backend.
+    """
+    for sessions in (story_sessions, user_sessions):
+        session = sessions.get(session_id)
+        if session is not None:
+            return sessions, session
+    raise HTTPException(status_code=404, detail="Session not found")
+
 @app.post("/api/shortlist")
 async def add_to_shortlist(request: dict):
     """Add design to premium collection"""
@@ -594,19 +1484,295 @@ async def add_to_shortlist(request: dict):
     if not session_id:
         raise HTTPException(status_code=400, detail="Session ID required")
     
-    # Implementation for shortlisting would go here
+    sessions, session = find_session(session_id)
+    
+    shortlist = session.setdefault("shortlist", [])
+    if design_id and design_id not in shortlist:
+        # A design this session was shown keeps its narrative; one served elsewhere
+        # on this worker is known only by its attributes
+        design = next((s for s in session.get("suggestions", []) if s["id"] == design_id), None)
+        design = design or design_registry.get(design_id)
+        if design is None:
+            raise HTTPException(status_code=404, detail="Design not found")
+        # Copied into the session so any worker, before or after a restart, can list it
+        shortlist.append(design_id)
+        session.setdefault("shortlist_designs", {})[design_id] = design
+        sessions.set(session_id, session)
+    
     return {
         "message": "Added to your premium collection! Our diamond specialist will prepare detailed specifications for your viewing.",
         "collection_status": "premium",
-        "next_steps": "Schedule private consultation to view piece"
+        "next_steps": "Schedule private consultation to view piece",
+        "shortlist_count": len(shortlist)
+    }
+
+@app.get("/api/shortlist/{session_id}")
+async def get_shortlist(session_id: str):
+    """Shortlisted designs for a session.
+
+    Designs are read from the session; IDs it holds no copy of are looked
+    up in this worker's registry, and any still unknown are listed under
+    ``unresolved``.
+    """
+    
+    _, session = find_session(session_id)
+    design_ids = session.get("shortlist", [])
+    stored = session.get("shortlist_designs", {})
+    registered = design_registry.resolve(design_id for design_id in design_ids if design_id not in stored)
+    designs = [stored.get(design_id) or registered.get(design_id) for design_id in design_ids]
+    
+    return ORJSONResponse({
+        "session_id": session_id,
+        "design_ids": design_ids,
+        "designs": [design for design in designs if design is not None],
+        "unresolved": [design_id for design_id, design in zip(design_ids, designs) if design is None],
+        "count": sum(design is not None for design in designs)
+    })
+
+@app.on_event("startup")
+def start_catalog_watcher():
+    catalog_watcher.start()
+    static_assets.start()
+
+# Readiness: a worker is ready once it has run every pipeline end to end
+worker_ready = threading.Event()
+warm_up_timings: Dict[str, float] = {}
+_warm_up_task = None
+
+WARM_UP_STORY = StoryRecommendationRequest(
+    story=StoryData(love_story="We met hiking at sunset and share a love of vintage art",
+                    special_moments="her laugh"),
+    preferences=PremiumPreferences(budget_range="10000-20000")
+)
+
+def warm_up() -> Dict[str, float]:
+    """Run each pipeline once and build lazy indexes, so the first real requests skip that work.
+
+    Returns the seconds each step took; stage timings are discarded. Safe
+    to call before forking workers, so whatever it builds is shared with
+    them.
+    """
+    steps = {
+        "story": lambda: build_story_recommendations(WARM_UP_STORY, rng=random.Random(0)),
+        "stream": lambda: list(iter_story_recommendations(WARM_UP_STORY, rng=random.Random(0))),
+        "preferences": lambda: build_preference_recommendations(PremiumPreferences(), rng=random.Random(0)),
+        "inventory_index": lambda: inventory is not None and inventory.find("")
+    }
+    timings = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        collect_stages(step)
+        timings[name] = time.perf_counter() - started
+    return timings
+
+@app.on_event("startup")
+async def start_warm_up():
+    """Warm up on the pipeline executor, which also starts its pool, and preload
+    Pillow in the image workers; report ready only after both"""
+    global _warm_up_task
+    
+    async def run():
+        try:
+            timings = await pipeline_executor.run(warm_up)
+            started = time.perf_counter()
+            await asyncio.get_running_loop().run_in_executor(get_image_pool(), preload_image_libraries)
+            timings["image_pool"] = time.perf_counter() - started
+        except Exception:
+            logger.exception("Warm-up failed; this worker will not report ready")
+            return
+        warm_up_timings.update(timings)
+        worker_ready.set()
+    
+    _warm_up_task = asyncio.get_running_loop().create_task(run())
+
+@app.get("/api/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+@app.get("/api/health/ready")
+async def readiness():
+    """200 once this worker has warmed up, 503 until then"""
+    if not worker_ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {
+        "status": "ready",
+        "catalog_version": catalog_watcher.current.version,
+        "warm_up_seconds": {name: round(seconds, 4) for name, seconds in warm_up_timings.items()}
+    }
+
+@app.on_event("startup")
+def start_similarity_index():
+    """Index the inventory in the background; until then similar-design queries scan exactly"""
+    if inventory is not None and not similar_designs.built:
+        threading.Thread(target=similar_designs.build, name="similarity-build", daemon=True).start()
+
+@app.on_event("shutdown")
+def close_session_stores():
+    """Flush write-behind session writes before the worker exits"""
+    catalog_watcher.stop()
+    static_assets.stop()
+    story_sessions.close()
+    user_sessions.close()
+    for pool in (_batch_pool, _image_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    pipeline_executor.shutdown()
+
+@app.get("/api/system/stats")
+async def get_system_stats():
+    """Executor queue, session store, cache and catalog statistics for this worker"""
+    return {
+        "catalog": catalog_watcher.stats(),
+        "inventory": {"version": inventory.version, "skus": len(inventory)} if inventory is not None else None,
+        "design_registry": design_registry.stats(),
+        "static_assets": static_assets.stats(),
+        "similar_designs": similar_designs.stats(),
+        "executor": pipeline_executor.stats(),
+        "sessions": {
+            "story": story_sessions.stats(),
+            "user": user_sessions.stats()
+        },
+        "recommendation_cache": recommendation_cache.stats(),
+        "image_cache": image_cache.stats()
+    }
+
+# Scrape-time gauges over the stores, caches and executor
+REGISTRY.callback(
+    "lumiere_session_entries", "Sessions resident in each store", ("store",),
+    lambda: [(("story",), story_sessions.stats()["entries"]), (("user",), user_sessions.stats()["entries"])]
+)
+REGISTRY.callback(
+    "lumiere_session_bytes", "Approximate bytes held by each session store", ("store",),
+    lambda: [((name,), store.stats()["resident_bytes"])
+             for name, store in (("story", story_sessions), ("user", user_sessions))]
+)
+REGISTRY.callback(
+    "lumiere_executor_in_flight", "Pipeline jobs running on the executor", (),
+    lambda: [((), pipeline_executor.in_flight)]
+)
+REGISTRY.callback(
+    "lumiere_executor_queue_depth", "Pipeline jobs waiting for an executor slot", (),
+    lambda: [((), pipeline_executor.queue_depth)]
+)
+REGISTRY.callback(
+    "lumiere_executor_jobs_total", "Pipeline jobs by outcome", ("outcome",),
+    lambda: [(("completed",), pipeline_executor.completed), (("rejected",), pipeline_executor.rejected),
+             (("timed_out",), pipeline_executor.timed_out)],
+    metric_type="counter"
+)
+REGISTRY.callback(
+    "lumiere_cache_lookups_total", "Result cache lookups by cache and outcome", ("cache", "outcome"),
+    lambda: [(("recommendation", "hit"), recommendation_cache.hits),
+             (("recommendation", "miss"), recommendation_cache.misses),
+             (("image", "exact_hit"), image_cache.exact_hits),
+             (("image", "near_hit"), image_cache.near_hits),
+             (("image", "miss"), image_cache.misses)],
+    metric_type="counter"
+)
+REGISTRY.callback(
+    "lumiere_catalog_info", "Catalog version currently served", ("version",),
+    lambda: [((catalog_watcher.current.version,), 1)]
+)
+REGISTRY.callback(
+    "lumiere_catalog_loaded_timestamp_seconds", "When the served catalog was loaded", (),
+    lambda: [((), catalog_watcher.loaded_at)]
+)
+REGISTRY.callback(
+    "lumiere_catalog_reloads_total", "Catalog reloads by outcome", ("outcome",),
+    lambda: [(("published",), catalog_watcher.reloads), (("failed",), catalog_watcher.failures)],
+    metric_type="counter"
+)
+REGISTRY.callback(
+    "lumiere_design_registry_entries", "Distinct designs held by the design registry", (),
+    lambda: [((), len(design_registry))]
+)
+REGISTRY.callback(
+    "lumiere_static_responses_total", "Static asset responses by encoding and status", ("encoding", "status"),
+    lambda: [((encoding, str(status)), count) for (encoding, status), count in list(static_assets.served.items())],
+    metric_type="counter"
+)
+REGISTRY.callback(
+    "lumiere_static_bytes_sent_total", "Static asset body bytes sent by encoding", ("encoding",),
+    lambda: [((encoding,), sent) for encoding, sent in list(static_assets.bytes_sent.items())],
+    metric_type="counter"
+)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def require_admin(request: Request):
+    """Admin routes only exist when LUMIERE_ADMIN_TOKEN is set"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/api/admin/profile/cpu", dependencies=[Depends(require_admin)])
+async def profile_cpu(seconds: float = 10.0, requests: Optional[int] = None,
+                      interval_ms: float = 5.0, include_idle: bool = False):
+    """Sample this worker's stacks for ``seconds`` or until ``requests`` more requests finish.
+
+    Returns collapsed stacks, one ``frame;frame;... count`` line each, for
+    flamegraph.pl or speedscope.
+    """
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS:g}]")
+    if requests is not None and requests < 1:
+        raise HTTPException(status_code=400, detail="requests must be at least 1")
+    if not 0.5 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 0.5 and 1000")
+    
+    try:
+        result = await cpu_profiler.profile(seconds, requests, interval_ms / 1000, include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    headers = {
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Profile-Seconds": f"{result['elapsed_seconds']:.3f}"
     }
+    if result["requests"] is not None:
+        headers["X-Profile-Requests"] = str(result["requests"])
+    return PlainTextResponse(result["collapsed"] + "\n", headers=headers)
+
+@app.post("/api/admin/profile/memory/start", dependencies=[Depends(require_admin)])
+async def start_memory_profile(frames: int = 10):
+    """Start tracemalloc; allocations are traced (and slower) until stopped"""
+    return memory_profiler.start(max(1, min(frames, 100)))
+
+@app.get("/api/admin/profile/memory/snapshot", dependencies=[Depends(require_admin)])
+async def memory_snapshot(top: int = 25, group_by: str = "lineno"):
+    """Top allocation sites and their growth since the previous snapshot"""
+    gauges = {
+        "story_sessions.entries": story_sessions.stats()["entries"],
+        "user_sessions.entries": user_sessions.stats()["entries"],
+        "recommendation_cache.entries": recommendation_cache.stats()["entries"],
+        "design_registry.entries": len(design_registry),
+        "image_cache.entries": image_cache.stats()["entries"]
+    }
+    try:
+        return memory_profiler.snapshot(top, group_by, gauges)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/admin/profile/memory/stop", dependencies=[Depends(require_admin)])
+async def stop_memory_profile():
+    return memory_profiler.stop()
 
 @app.get("/api/data/options")
 async def get_premium_options():
     """Get premium jewelry options"""
+    # One snapshot, so every list comes from the same catalog version
+    catalog = catalog_watcher.current.catalog
     return {
-        "diamond_shapes": list(PREMIUM_JEWELRY_DATA["diamonds"].keys()),
-        "premium_metals": list(PREMIUM_JEWELRY_DATA["premium_metals"].keys()),
+        "diamond_shapes": list(catalog.shapes),
+        "center_stones": list(catalog.stones),
+        "premium_metals": list(catalog.metals),
         "story_themes": list(PREMIUM_JEWELRY_DATA["story_themes"].keys()),
         "budget_ranges": [
             "5000-10000", "10000-20000", "20000-50000", 
@@ -623,18 +1789,3 @@ if __name__ == "__main__":
         os.makedirs("static")
     
     uvicorn.run(app, host="0.0.0.0", port=8000)
-
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-import os
-
-# Mount static files
-if os.path.exists("static"):
-    app.mount("/static", StaticFiles(directory="static"), name="static")
-
-@app.get("/")
-async def serve_frontend():
-    if os.path.exists("static/index.html"):
-        return FileResponse("static/index.html")
-    else:
-        return {"message": "Frontend not found. Please ensure static/index.html exists."}
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""
+In-process metrics with a Prometheus text exposition.
+
+Counters and histograms are plain dicts of floats guarded by a lock, so
+recording a sample costs a couple of dictionary operations. Gauges are
+callbacks evaluated only when /metrics is scraped.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                    lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, le)} "
+                                 f"{format_value(cumulative)}")
+                label_text = format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_text} {series[-1]!r}")
+                lines.append(f"{self.name}_count{label_text} {format_value(cumulative)}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose samples come from a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...],
+                 collect: Callable[[], Iterable[Tuple[LabelValues, float]]], metric_type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.collect = collect
+        self.metric_type = metric_type
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self._add(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self._add(Histogram(*args, **kwargs))
+
+    def callback(self, *args, **kwargs) -> CallbackMetric:
+        return self._add(CallbackMetric(*args, **kwargs))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "lumiere_stage_seconds", "Time spent in each recommendation pipeline stage",
+    ("endpoint", "stage")
+)
+REQUESTS_TOTAL = REGISTRY.counter(
+    "lumiere_requests_total", "HTTP requests by route and status", ("route", "status")
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "lumiere_request_seconds", "HTTP request latency, including streamed bodies", ("route",)
+)
+REQUESTS_IN_FLIGHT = [0]
+REGISTRY.callback(
+    "lumiere_requests_in_flight", "HTTP requests currently being handled", (),
+    lambda: [((), REQUESTS_IN_FLIGHT[0])]
+)
+
+# Pipeline whose stages are being timed, set by @pipeline
+_current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="other")
+# Set inside worker processes so stage timings can be shipped back to the parent
+_stage_recorder: ContextVar[Optional[List[Tuple[str, str, float]]]] = ContextVar("stage_recorder", default=None)
+
+
+def pipeline(endpoint: str):
+    """Decorator attributing stages timed inside the function to ``endpoint``"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_endpoint.set(endpoint)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_endpoint.reset(token)
+        return wrapper
+    return decorator
+
+
+def pipeline_context(endpoint: str) -> Context:
+    """Copy of the current context with stages attributed to ``endpoint``.
+
+    For pipelines run in steps, such as a generator advanced through an
+    executor, where ``pipeline`` has no single call to wrap.
+    """
+    context = copy_context()
+    context.run(_current_endpoint.set, endpoint)
+    return context
+
+
+def observe_stage(name: str, seconds: float, endpoint: Optional[str] = None):
+    endpoint = endpoint or _current_endpoint.get()
+    recorder = _stage_recorder.get()
+    if recorder is not None:
+        recorder.append((endpoint, name, seconds))
+    else:
+        STAGE_SECONDS.observe(seconds, endpoint, name)
+
+
+@contextmanager
+def stage(name: str, endpoint: Optional[str] = None):
+    """Time a block of work as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started, endpoint)
+
+
+def collect_stages(func: Callable, *args, **kwargs):
+    """Run ``func`` recording stage timings locally; returns (result, timings).
+
+    Used for work sent to a process pool, where the worker's histograms
+    would never be scraped.
+    """
+    timings: List[Tuple[str, str, float]] = []
+    token = _stage_recorder.set(timings)
+    try:
+        return func(*args, **kwargs), timings
+    finally:
+        _stage_recorder.reset(token)
+
+
+def replay_stages(timings: Iterable[Tuple[str, str, float]]):
+    """Record timings collected in another process"""
+    for endpoint, name, seconds in timings:
+        STAGE_SECONDS.observe(seconds, endpoint, name)
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them until the body is sent.
+
+    Requests are labelled by the matched endpoint's name rather than the
+    raw path, so label cardinality stays fixed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT[0] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT[0] -= 1
+            endpoint = scope.get("endpoint")
+            route = getattr(endpoint, "__name__", type(endpoint).__name__) if endpoint else "unmatched"
+            REQUESTS_TOTAL.inc(route, status[0])
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route)
@@ -0,0 +1,207 @@
+"""
+On-demand CPU and memory profiling for a live worker.
+
+The CPU profiler is a sampling profiler: a background thread reads every
+other thread's Python stack at a fixed interval and counts identical
+stacks, producing the "collapsed" format read by flamegraph.pl,
+speedscope and similar tools. Nothing is hooked into the interpreter, so
+request handling runs at full speed outside a profiling window.
+
+The memory profiler wraps tracemalloc and reports what grew between
+consecutive snapshots.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# Leaf frames in these modules are threads parked on a lock, queue or socket
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profiling window is already open"""
+
+
+def collapse_stack(frame, thread_name: str) -> str:
+    """Render a frame chain root-first as ``thread;func (file:line);...``"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    parts.append(thread_name.replace(" ", "_"))
+    return ";".join(reversed(parts))
+
+
+class SamplingProfiler:
+    """Samples all Python thread stacks for a time window or a number of requests.
+
+    Only one window may be open at a time. ``request_finished`` is called
+    by ProfilingMiddleware and is a no-op unless a request-bounded window
+    is open.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._samples: Counter = Counter()
+        self._sample_count = 0
+        self._requests_left: Optional[int] = None
+        self._done: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def profile(self, seconds: float, requests: Optional[int] = None,
+                      interval: float = 0.005, include_idle: bool = False) -> Dict[str, Any]:
+        """Sample until ``requests`` requests finish or ``seconds`` pass"""
+        with self._lock:
+            if self._thread is not None:
+                raise ProfilerBusy("A profiling window is already open")
+            self._samples = Counter()
+            self._sample_count = 0
+            self._requests_left = requests
+            self._loop = asyncio.get_running_loop()
+            self._done = asyncio.Event()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._sample, args=(interval, include_idle), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._stop.set()
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+            with self._lock:
+                self._thread = None
+                requests_left, self._requests_left = self._requests_left, None
+
+        return {
+            "elapsed_seconds": time.perf_counter() - started,
+            "samples": self._sample_count,
+            "requests": requests - requests_left if requests is not None else None,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in self._samples.most_common())
+        }
+
+    def request_finished(self):
+        if self._requests_left is None:
+            return
+        with self._lock:
+            if self._requests_left is None:
+                return
+            self._requests_left -= 1
+            if self._requests_left <= 0:
+                self._loop.call_soon_threadsafe(self._done.set)
+
+    def _sample(self, interval: float, include_idle: bool):
+        own_id = threading.get_ident()
+        while not self._stop.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                self._samples[collapse_stack(frame, names.get(thread_id, str(thread_id)))] += 1
+            self._sample_count += 1
+
+
+class ProfilingMiddleware:
+    """Counts finished requests for request-bounded profiling windows"""
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if scope["type"] == "http":
+                self.profiler.request_finished()
+
+
+class MemoryProfiler:
+    """tracemalloc snapshots, each diffed against the previous one"""
+
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_gauges: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._previous = None
+            self._previous_gauges = {}
+            return self._traced()
+
+    def stop(self) -> Dict[str, Any]:
+        with self._lock:
+            traced = self._traced()
+            tracemalloc.stop()
+            self._previous = None
+            return {**traced, "tracing": False}
+
+    def snapshot(self, top: int = 25, group_by: str = "lineno",
+                 gauges: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Largest allocation sites, and how each changed since the last snapshot.
+
+        ``gauges`` are application counters (e.g. session entries) reported
+        with their change, to tie heap growth to what the app is holding.
+        """
+        if group_by not in ("lineno", "filename", "traceback"):
+            raise ValueError(f"Unknown grouping: {group_by}")
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("Memory tracing is not running")
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            ))
+            if self._previous is not None:
+                stats = snapshot.compare_to(self._previous, group_by)
+            else:
+                stats = snapshot.statistics(group_by)
+
+            gauges = gauges or {}
+            report = {
+                **self._traced(),
+                "compared_to_previous": self._previous is not None,
+                "top": [self._describe(stat) for stat in stats[:top]],
+                "gauges": {
+                    name: {"value": value, "change": value - self._previous_gauges.get(name, value)}
+                    for name, value in gauges.items()
+                }
+            }
+            self._previous = snapshot
+            self._previous_gauges = dict(gauges)
+            return report
+
+    @staticmethod
+    def _describe(stat) -> Dict[str, Any]:
+        frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+        return {
+            "location": frames[0] if len(frames) == 1 else frames,
+            "size_bytes": stat.size,
+            "size_change_bytes": getattr(stat, "size_diff", 0),
+            "count": stat.count,
+            "count_change": getattr(stat, "count_diff", 0)
+        }
+
+    @staticmethod
+    def _traced() -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": tracemalloc.is_tracing(), "traced_bytes": current, "peak_bytes": peak}
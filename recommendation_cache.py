@@ -0,0 +1,73 @@
+"""
+Content-addressed cache for deterministic recommendation results.
+
+Requests are fingerprinted from their normalized inputs. The fingerprint
+seeds a per-request ``random.Random`` so identical inputs always produce
+identical designs, and keys an LRU cache of the generated results.
+"""
+
+import hashlib
+import json
+import random
+import re
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from session_store import SessionStore
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(value: Any) -> Any:
+    """Collapse whitespace and treat blank strings as missing"""
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, str):
+        return WHITESPACE.sub(" ", value).strip() or None
+    return value
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """Stable hash of the normalized request inputs"""
+    canonical = json.dumps(normalize(list(parts)), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def seeded_rng(fingerprint: str) -> random.Random:
+    """Per-request generator seeded from a request fingerprint"""
+    return random.Random(int(fingerprint[:16], 16))
+
+
+class RecommendationCache:
+    """LRU cache of generated results with hit and miss counters"""
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024,
+                 ttl_seconds: float = 3600):
+        self._store = SessionStore(max_entries, max_bytes, ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._store.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        self._store.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            **self._store.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,341 @@
+"""
+Session storage backends.
+
+The default in-memory store keeps sessions in least-recently-used order
+and evicts them when it exceeds its entry count or byte budget, or when
+they outlive the TTL. The SQLite backend keeps sessions in a local WAL
+database shared by every worker on the host, with writes batched off the
+request path.
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate resident size of a session record in bytes"""
+    return len(orjson.dumps(value, default=str))
+
+
+class SessionBackend(ABC):
+    """Interface shared by every session storage backend"""
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def get(self, key: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        ...
+
+    def close(self):
+        """Release resources and flush pending writes"""
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class SessionStore(SessionBackend):
+    """Thread-safe LRU session store with a sliding TTL and byte budget"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def set(self, key: str, value: Dict[str, Any]):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl_seconds)
+            self.resident_bytes += size
+            self._evict()
+
+    def get(self, key: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            now = time.monotonic()
+            if entry[2] <= now:
+                self._remove(key)
+                self.expirations += 1
+                return default
+            # Sliding expiry keeps the LRU order sorted by expiry time too
+            self._entries[key] = (entry[0], entry[1], now + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.resident_bytes -= size
+
+    def _evict(self):
+        now = time.monotonic()
+        # Expired entries first; the oldest sit at the front of the LRU order
+        while self._entries:
+            key, (_, _, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self.resident_bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class SQLiteSessionStore(SessionBackend):
+    """Session store backed by a local SQLite database in WAL mode.
+
+    Writes are queued and flushed by a background thread in batches, so a
+    request only pays for a queue put. Pending writes are also kept in a
+    small overlay so this worker reads its own sessions before they land.
+
+    A batch that fails to commit (for example ``database is locked`` while
+    another worker holds the write lock) is retried with backoff and then
+    dropped and logged, so one bad batch never stops the writer.
+    """
+
+    CREATE_SQL = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            namespace TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (namespace, session_id)
+        )
+    """
+    UPSERT_SQL = "INSERT OR REPLACE INTO sessions (namespace, session_id, payload, expires_at) VALUES (?, ?, ?, ?)"
+    DELETE_SQL = "DELETE FROM sessions WHERE namespace = ? AND session_id = ?"
+    SELECT_SQL = "SELECT payload, expires_at FROM sessions WHERE namespace = ? AND session_id = ?"
+    EXPIRE_SQL = "DELETE FROM sessions WHERE expires_at <= ?"
+    COUNT_SQL = "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM sessions WHERE namespace = ?"
+
+    def __init__(self, path: str, namespace: str, ttl_seconds: float = 3600,
+                 batch_size: int = 256, flush_interval: float = 0.05, max_retries: int = 3):
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.batches_written = 0
+        self.rows_written = 0
+        self.batches_failed = 0
+        self.rows_dropped = 0
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(self.CREATE_SQL)
+
+        self._start_writer()
+        # A forked worker gets its own writer thread and connections
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start_writer)
+
+    def _start_writer(self):
+        self._local = threading.local()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending: Dict[str, Optional[str]] = {}
+        self._pending_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name=f"sessions-{self.namespace}", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 caches the prepared statements
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def set(self, key: str, value: Dict[str, Any]):
+        payload = orjson.dumps(value, default=str)
+        with self._pending_lock:
+            self._pending[key] = payload
+        self._queue.put((key, payload, time.time() + self.ttl_seconds))
+
+    def get(self, key: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._pending_lock:
+            if key in self._pending:
+                payload = self._pending[key]
+                return orjson.loads(payload) if payload is not None else default
+
+        row = self._reader().execute(self.SELECT_SQL, (self.namespace, key)).fetchone()
+        if row is None or row[1] <= time.time():
+            return default
+        return orjson.loads(row[0])
+
+    def delete(self, key: str):
+        with self._pending_lock:
+            self._pending[key] = None
+        self._queue.put((key, None, 0.0))
+
+    def _write_loop(self):
+        conn = self._connect()
+        last_expiry = time.time()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            stop = any(item is None for item in batch)
+            writes = [item for item in batch if item is not None]
+            try:
+                self._flush_with_retry(conn, writes)
+
+                now = time.time()
+                if now - last_expiry > self.ttl_seconds / 10:
+                    try:
+                        with conn:
+                            conn.execute(self.EXPIRE_SQL, (now,))
+                    except sqlite3.Error as e:
+                        # Expired rows are already hidden from reads; try again next interval
+                        logger.warning("Session expiry in %s failed: %s", self.path, e)
+                    last_expiry = now
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _flush_with_retry(self, conn: sqlite3.Connection, writes):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._flush(conn, writes)
+                return
+            except Exception as e:
+                error = e
+                if attempt < self.max_retries:
+                    time.sleep(min(self.flush_interval * 2 ** attempt, 1.0))
+        self.batches_failed += 1
+        self.rows_dropped += len(writes)
+        logger.error("Dropping %d session writes to %s after %d attempts: %s",
+                     len(writes), self.path, self.max_retries + 1, error)
+        # Forget the dropped writes so the overlay does not grow without bound
+        with self._pending_lock:
+            for key, payload, _ in writes:
+                if self._pending.get(key, payload) == payload:
+                    self._pending.pop(key, None)
+
+    def _flush(self, conn: sqlite3.Connection, writes):
+        if not writes:
+            return
+        upserts = [(self.namespace, key, payload, expires_at)
+                   for key, payload, expires_at in writes if payload is not None]
+        deletes = [(self.namespace, key) for key, payload, _ in writes if payload is None]
+        with conn:
+            if upserts:
+                conn.executemany(self.UPSERT_SQL, upserts)
+            if deletes:
+                conn.executemany(self.DELETE_SQL, deletes)
+        self.batches_written += 1
+        self.rows_written += len(writes)
+
+        # Drop overlay entries unless a newer write arrived meanwhile
+        with self._pending_lock:
+            for key, payload, _ in writes:
+                if self._pending.get(key, payload) == payload:
+                    self._pending.pop(key, None)
+
+    def flush(self):
+        """Block until every queued write has been committed"""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def stats(self) -> Dict[str, int]:
+        entries, resident_bytes = self._reader().execute(self.COUNT_SQL, (self.namespace,)).fetchone()
+        return {
+            "entries": entries,
+            "resident_bytes": resident_bytes,
+            "pending_writes": self._queue.qsize(),
+            "batches_written": self.batches_written,
+            "rows_written": self.rows_written,
+            "batches_failed": self.batches_failed,
+            "rows_dropped": self.rows_dropped
+        }
+
+
+def create_session_store(namespace: str) -> SessionBackend:
+    """Build the session backend selected by the LUMIERE_SESSION_* settings"""
+    backend = os.environ.get("LUMIERE_SESSION_BACKEND", "memory")
+    ttl_seconds = float(os.environ.get("LUMIERE_SESSION_TTL_SECONDS", "3600"))
+
+    if backend == "memory":
+        return SessionStore(
+            max_entries=int(os.environ.get("LUMIERE_SESSION_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.environ.get("LUMIERE_SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+            ttl_seconds=ttl_seconds
+        )
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            path=os.environ.get("LUMIERE_SESSION_DB", "sessions.db"),
+            namespace=namespace,
+            ttl_seconds=ttl_seconds
+        )
+    raise ValueError(f"Unknown session backend: {backend}")
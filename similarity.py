@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Design similarity search.
+
+Designs are encoded as unit-length feature vectors, so the dot product of
+two vectors is their cosine similarity. Categorical attributes are
+one-hot, colors are hashed into a few buckets, carat and clarity are
+spread over neighbouring bins so close values overlap, and style tags
+are multi-hot. Each block is weighted by how much it should count.
+
+IVFIndex is an inverted-file approximate nearest-neighbour index. Spherical
+k-means groups the vectors around centroids, and a query scans only the
+lists of its nearest few centroids. Inventory SKUs are indexed in one bulk
+block. Designs produced while serving are added one at a time to a
+fixed-capacity ring, so memory stays bounded. Training runs off the
+request path, and until it finishes, queries fall back to an exact scan.
+
+Recall and latency against brute-force search:
+
+    python similarity.py --designs 200000 --queries 200
+"""
+
+import argparse
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from catalog import Catalog
+from inventory import MAX_THEMES, THEME_MASKS, Inventory
+
+# Relative weight of each attribute block in the similarity score
+FEATURE_WEIGHTS = {
+    "stone": 1.0, "shape": 1.0, "metal": 0.8, "setting": 0.6,
+    "carat": 0.8, "color": 0.4, "clarity": 0.4, "tags": 0.6
+}
+
+# Catalog attribute blocks and the design field each one encodes
+CATEGORICAL_FIELDS = {"stone": "stone_type", "shape": "stone_shape", "metal": "metal_type", "setting": "setting_type"}
+
+CARAT_BINS = np.linspace(0.5, 3.5, 8)
+CARAT_BANDWIDTH = 0.3
+CLARITY_BINS = np.linspace(0.0, 1.0, 4)
+CLARITY_BANDWIDTH = 0.3
+COLOR_BUCKETS = 8
+
+# K-means sample size per list, iterations, and the rows scored per matrix product
+TRAIN_PER_LIST = 40
+TRAIN_ITERATIONS = 10
+CHUNK_ROWS = 8192
+# Incremental vectors needed before the first training run
+MIN_TRAIN = 2048
+
+DESIGN_FIELDS = ("id", "stone_type", "stone_shape", "stone_color", "stone_clarity", "carat_weight",
+                 "metal_type", "setting_type", "estimated_price", "style_tags")
+
+
+def _soft_bins(values: np.ndarray, bins: np.ndarray, bandwidth: float) -> np.ndarray:
+    """Gaussian membership of each value in each bin, normalized per value"""
+    weights = np.exp(-0.5 * ((np.asarray(values, dtype=np.float32)[:, None] - bins[None, :]) / bandwidth) ** 2)
+    return weights / np.maximum(np.linalg.norm(weights, axis=1, keepdims=True), 1e-12)
+
+
+def _color_bucket(color: str) -> int:
+    return zlib.crc32(color.lower().encode("utf-8")) % COLOR_BUCKETS
+
+
+class DesignEncoder:
+    """Maps designs to unit vectors over a fixed catalog vocabulary.
+
+    Names outside the vocabulary (a stone added by a later catalog
+    reload, say) encode as an all-zero block rather than failing.
+    """
+
+    def __init__(self, catalog: Catalog, tags: Sequence[str]):
+        self.vocabularies = {
+            "stone": catalog.stones.names,
+            "shape": catalog.shapes.names,
+            "metal": catalog.metals.names,
+            "setting": catalog.settings.names,
+        }
+        self.codes = {block: {name: i for i, name in enumerate(names)}
+                      for block, names in self.vocabularies.items()}
+        self.clarity_rank = {name: i / max(len(catalog.clarity) - 1, 1) for i, name in enumerate(catalog.clarity.names)}
+        self.tags = {tag: i for i, tag in enumerate(dict.fromkeys(tags))}
+
+        sizes = {block: len(names) for block, names in self.vocabularies.items()}
+        sizes.update(carat=len(CARAT_BINS), color=COLOR_BUCKETS, clarity=len(CLARITY_BINS), tags=len(self.tags))
+        self.slices = {}
+        start = 0
+        for block in FEATURE_WEIGHTS:
+            self.slices[block] = slice(start, start + sizes[block])
+            start += sizes[block]
+        self.dim = start
+
+    def _one_hot_table(self, block: str, names: Sequence[str]) -> np.ndarray:
+        """Block vectors for ``names`` (rows) in encoder coordinates"""
+        table = np.zeros((len(names), self.slices[block].stop - self.slices[block].start), dtype=np.float32)
+        for row, name in enumerate(names):
+            code = self.codes[block].get(name)
+            if code is not None:
+                table[row, code] = FEATURE_WEIGHTS[block]
+        return table
+
+    def _clarity_rank(self, clarity: str) -> float:
+        # Colored-stone grades not in the catalog rank with the best ones
+        return self.clarity_rank.get(clarity, 1.0 if clarity in ("eye-clean", "") else 0.5)
+
+    def encode(self, design: Mapping[str, Any]) -> np.ndarray:
+        """Vector for one design given as a dict with PremiumDesign fields"""
+        return self.encode_many([design])[0]
+
+    def encode_many(self, designs: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        vectors = np.zeros((len(designs), self.dim), dtype=np.float32)
+        for block, field in CATEGORICAL_FIELDS.items():
+            names = [design.get(field, "diamond" if block == "stone" else "") for design in designs]
+            vectors[:, self.slices[block]] = self._one_hot_table(block, names)
+        vectors[:, self.slices["carat"]] = FEATURE_WEIGHTS["carat"] * _soft_bins(
+            [float(design.get("carat_weight", 0.0)) for design in designs], CARAT_BINS, CARAT_BANDWIDTH)
+        vectors[:, self.slices["clarity"]] = FEATURE_WEIGHTS["clarity"] * _soft_bins(
+            [self._clarity_rank(design.get("stone_clarity", "")) for design in designs], CLARITY_BINS, CLARITY_BANDWIDTH)
+        color = self.slices["color"].start
+        tags = self.slices["tags"].start
+        for row, design in enumerate(designs):
+            vectors[row, color + _color_bucket(design.get("stone_color", ""))] = FEATURE_WEIGHTS["color"]
+            codes = [self.tags[tag] for tag in design.get("style_tags", ()) if tag in self.tags]
+            for code in codes:
+                vectors[row, tags + code] = FEATURE_WEIGHTS["tags"] / np.sqrt(len(codes))
+        return _normalize(vectors)
+
+    def encode_inventory(self, inventory: Inventory) -> np.ndarray:
+        """Half-precision vectors for every SKU, gathered from per-code lookup tables"""
+        columns = inventory.columns
+
+        # Design codes index a (stone, shape, metal) product table
+        stone = self._one_hot_table("stone", inventory.stones)
+        shape = self._one_hot_table("shape", inventory.shapes)
+        metal = self._one_hot_table("metal", inventory.metals)
+        designs = np.concatenate([
+            np.repeat(stone, len(inventory.shapes) * len(inventory.metals), axis=0),
+            np.tile(np.repeat(shape, len(inventory.metals), axis=0), (len(inventory.stones), 1)),
+            np.tile(metal, (len(inventory.stones) * len(inventory.shapes), 1)),
+        ], axis=1)
+        settings = self._one_hot_table("setting", inventory.settings)
+
+        colors = np.zeros((len(inventory.colors), COLOR_BUCKETS), dtype=np.float32)
+        colors[np.arange(len(inventory.colors)), [_color_bucket(name) for name in inventory.colors]] = FEATURE_WEIGHTS["color"]
+
+        clarities = FEATURE_WEIGHTS["clarity"] * _soft_bins(
+            [self._clarity_rank(name) for name in inventory.clarities], CLARITY_BINS, CLARITY_BANDWIDTH)
+
+        # Theme masks index a table over every possible mask
+        tags = np.zeros((len(THEME_MASKS), len(self.tags)), dtype=np.float32)
+        for bit, theme in enumerate(inventory.themes[:MAX_THEMES]):
+            if theme in self.tags:
+                tags[:, self.tags[theme]] = (THEME_MASKS >> bit) & 1
+        tags *= FEATURE_WEIGHTS["tags"] / np.sqrt(np.maximum(tags.sum(axis=1, keepdims=True), 1))
+
+        vectors = np.empty((len(inventory), self.dim), dtype=np.float16)
+        first, last = self.slices["stone"].start, self.slices["metal"].stop
+        for start in range(0, len(inventory), CHUNK_ROWS):
+            rows = slice(start, start + CHUNK_ROWS)
+            chunk = np.empty((len(columns["price"][rows]), self.dim), dtype=np.float32)
+            chunk[:, first:last] = designs[columns["design"][rows]]
+            chunk[:, self.slices["setting"]] = settings[columns["setting"][rows]]
+            chunk[:, self.slices["carat"]] = FEATURE_WEIGHTS["carat"] * _soft_bins(
+                columns["carat"][rows], CARAT_BINS, CARAT_BANDWIDTH)
+            chunk[:, self.slices["color"]] = colors[columns["color"][rows]]
+            chunk[:, self.slices["clarity"]] = clarities[columns["clarity"][rows]]
+            chunk[:, self.slices["tags"]] = tags[columns["themes"][rows]]
+            vectors[rows] = _normalize(chunk)
+        return vectors
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for every vector"""
+    assignment = np.empty(len(vectors), dtype=np.intp)
+    for start in range(0, len(vectors), CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + CHUNK_ROWS], dtype=np.float32)
+        assignment[start:start + CHUNK_ROWS] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignment
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the ``k`` highest scores, best first"""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class IVFIndex:
+    """Inverted-file index for cosine similarity over unit vectors.
+
+    Positions ``0 .. base_size - 1`` belong to the bulk block passed to
+    ``build_base``, held in half precision. Positions from ``base_size``
+    up are the ring slots filled by ``add``; once all ``capacity`` slots
+    are used, the oldest is overwritten. Searches and adds are safe from
+    any thread. Training runs one at a time and publishes its lists in a
+    single step under the lock.
+    """
+
+    def __init__(self, dim: int, base_size: int = 0, capacity: int = 100_000,
+                 nprobe: int = 8, seed: int = 0):
+        self.dim = dim
+        self.base_size = base_size
+        self.capacity = capacity
+        self.nprobe = nprobe
+        self.trainings = 0
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._train_lock = threading.Lock()
+        self._training: Optional[threading.Thread] = None
+
+        self._centroids: Optional[np.ndarray] = None
+        self._base = np.empty((0, dim), dtype=np.float16)
+        # Base positions grouped by list: _base_order[_base_offsets[l]:_base_offsets[l + 1]]
+        self._base_order = np.empty(0, dtype=np.intp)
+        self._base_offsets = np.zeros(1, dtype=np.intp)
+
+        self._ring = np.zeros((capacity, dim), dtype=np.float32)
+        self._ring_live = np.zeros(capacity, dtype=bool)
+        self._ring_list = np.full(capacity, -1, dtype=np.intp)
+        self._ring_writes = np.zeros(capacity, dtype=np.int64)
+        self._ring_members: List[Set[int]] = []
+        # Live ring slots; an add only grows it until the ring wraps and starts evicting
+        self._ring_count = 0
+        self._next_slot = 0
+        self._trained_on = 0
+
+    def __len__(self) -> int:
+        return len(self._base) + self._ring_count
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def build_base(self, vectors: np.ndarray):
+        """Index the bulk block and train on it; blocking, so call it off the request path.
+
+        The block is exactly searchable as soon as it is stored, and
+        served through the lists once training finishes.
+        """
+        if len(vectors) != self.base_size:
+            raise ValueError(f"Expected {self.base_size} base vectors, got {len(vectors)}")
+        with self._lock:
+            self._base = np.asarray(vectors, dtype=np.float16)
+            self._centroids = None
+        self._train()
+
+    def add(self, vector: np.ndarray) -> int:
+        """Index one vector; returns its position"""
+        with self._lock:
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.capacity
+            previous = self._ring_list[slot]
+            if previous >= 0:
+                self._ring_members[previous].discard(slot)
+            self._ring[slot] = vector
+            if not self._ring_live[slot]:
+                self._ring_live[slot] = True
+                self._ring_count += 1
+            self._ring_writes[slot] += 1
+            self._ring_list[slot] = -1
+            if self._centroids is not None:
+                self._ring_list[slot] = int(np.argmax(self._centroids @ vector))
+                self._ring_members[self._ring_list[slot]].add(slot)
+            retrain = self._training is None and len(self) >= max(MIN_TRAIN, 2 * self._trained_on)
+            if retrain:
+                self._training = threading.Thread(target=self._train, name="ivf-training", daemon=True)
+                self._training.start()
+        return self.base_size + slot
+
+    def _train(self):
+        """Cluster everything indexed so far and rebuild the lists"""
+        try:
+            with self._train_lock:
+                with self._lock:
+                    base = self._base
+                    live = np.flatnonzero(self._ring_live)
+                    ring = self._ring[live]
+                    writes = self._ring_writes[live]
+                total = len(base) + len(ring)
+                if total == 0:
+                    return
+
+                nlist = int(np.clip(np.sqrt(total), 1, 4096))
+                rng = np.random.default_rng(self._seed)
+                sample_rows = np.sort(rng.choice(total, min(total, TRAIN_PER_LIST * nlist), replace=False))
+                sample = np.concatenate([
+                    np.asarray(base[sample_rows[sample_rows < len(base)]], dtype=np.float32),
+                    ring[sample_rows[sample_rows >= len(base)] - len(base)]
+                ])
+                centroids = self._kmeans(sample, nlist, rng)
+
+                base_lists = _nearest(base, centroids)
+                base_order = np.argsort(base_lists, kind="stable")
+                base_offsets = np.searchsorted(base_lists[base_order], np.arange(nlist + 1))
+                ring_lists = _nearest(ring, centroids)
+
+                with self._lock:
+                    # Slots rewritten meanwhile are filed against the new centroids too
+                    changed = self._ring_writes[live] != writes
+                    if changed.any():
+                        ring_lists[changed] = _nearest(self._ring[live[changed]], centroids)
+                    members = [set() for _ in range(nlist)]
+                    self._ring_list[:] = -1
+                    for slot, list_id in zip(live.tolist(), ring_lists.tolist()):
+                        self._ring_list[slot] = list_id
+                        members[list_id].add(slot)
+                    added = np.flatnonzero(self._ring_live & (self._ring_list < 0))
+                    for slot, list_id in zip(added.tolist(), _nearest(self._ring[added], centroids).tolist()):
+                        self._ring_list[slot] = list_id
+                        members[list_id].add(slot)
+
+                    self._base_order, self._base_offsets = base_order, base_offsets
+                    self._ring_members = members
+                    self._centroids = centroids
+                    self._trained_on = total
+                    self.trainings += 1
+        finally:
+            with self._lock:
+                if self._training is threading.current_thread():
+                    self._training = None
+
+    @staticmethod
+    def _kmeans(sample: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+        """Spherical k-means: centroids are unit-length means of their members"""
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(TRAIN_ITERATIONS):
+            assignment = _nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = _normalize(sums)
+        return centroids
+
+    def search(self, vector: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top ``k`` as (positions, similarities), best first"""
+        with self._lock:
+            if self._centroids is None:
+                return self._exact(vector, k)
+            lists = _top(self._centroids @ vector, min(nprobe or self.nprobe, len(self._centroids))).tolist()
+            base_rows = np.concatenate([self._base_order[self._base_offsets[l]:self._base_offsets[l + 1]]
+                                        for l in lists])
+            slots = np.fromiter((slot for l in lists for slot in self._ring_members[l]), dtype=np.intp)
+            base, ring = self._base, self._ring[slots]
+        return self._rank(vector, k, base, base_rows, ring, slots)
+
+    def exact_search(self, vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force top ``k`` over every indexed vector"""
+        with self._lock:
+            return self._exact(vector, k)
+
+    def _exact(self, vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        slots = np.flatnonzero(self._ring_live)
+        return self._rank(vector, k, self._base, None, self._ring[slots], slots)
+
+    def _rank(self, vector: np.ndarray, k: int, base: np.ndarray, base_rows: Optional[np.ndarray],
+              ring: np.ndarray, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Top ``k`` of the given base rows (all of them if None) and ring slots"""
+        if base_rows is None:
+            base_rows = np.arange(len(base))
+            base_scores = np.concatenate([np.empty(0, dtype=np.float32)] + [
+                np.asarray(base[start:start + CHUNK_ROWS], dtype=np.float32) @ vector
+                for start in range(0, len(base), CHUNK_ROWS)
+            ])
+        else:
+            base_scores = np.asarray(base[base_rows], dtype=np.float32) @ vector
+        positions = np.concatenate([base_rows, self.base_size + slots])
+        scores = np.concatenate([base_scores, ring @ vector])
+        top = _top(scores, k)
+        return positions[top], scores[top]
+
+
+class SimilarDesigns:
+    """Similar-design lookups over inventory SKUs and served designs.
+
+    Designs are looked up by id: SKUs through the inventory, served
+    designs through the ring of records kept alongside the index.
+    """
+
+    def __init__(self, encoder: DesignEncoder, inventory: Optional[Inventory] = None,
+                 capacity: int = 100_000, nprobe: int = 8):
+        self.encoder = encoder
+        self.inventory = inventory
+        self.index = IVFIndex(encoder.dim, base_size=len(inventory) if inventory is not None else 0,
+                              capacity=capacity, nprobe=nprobe)
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.built = False
+
+    def build(self):
+        """Encode and index the inventory; blocking, so call it off the request path"""
+        if self.inventory is not None:
+            self.index.build_base(self.encoder.encode_inventory(self.inventory))
+        self.built = True
+
+    def add(self, designs: Iterable[Mapping[str, Any]]):
+        """Index newly served designs; ids already known are skipped"""
+        for design in designs:
+            design_id = design["id"]
+            if design_id in self._positions or self._inventory_row(design_id) is not None:
+                continue
+            position = self.index.add(self.encoder.encode(design))
+            record = {field: design[field] for field in DESIGN_FIELDS if field in design}
+            with self._lock:
+                evicted = self._records.get(position)
+                if evicted is not None:
+                    self._positions.pop(evicted["id"], None)
+                self._records[position] = record
+                self._positions[design_id] = position
+
+    def _inventory_row(self, design_id: str) -> Optional[int]:
+        return self.inventory.find(design_id) if self.inventory is not None else None
+
+    def record(self, position: int) -> Optional[Dict[str, Any]]:
+        if position < self.index.base_size:
+            item = self.inventory.item(position)
+            return {"id": item.sku, **{field: getattr(item, field) for field in DESIGN_FIELDS[1:-1]},
+                    "style_tags": list(item.themes)}
+        return self._records.get(position)
+
+    def similar(self, design_id: str, k: int = 6) -> Optional[List[Dict[str, Any]]]:
+        """The ``k`` designs most like ``design_id``, or None if it is unknown"""
+        row = self._inventory_row(design_id)
+        if row is not None:
+            own_position, design = row, self.record(row)
+        else:
+            own_position = self._positions.get(design_id)
+            design = self._records.get(own_position) if own_position is not None else None
+        if design is None:
+            return None
+
+        positions, scores = self.index.search(self.encoder.encode(design), k + 1)
+        results = []
+        for position, score in zip(positions.tolist(), scores.tolist()):
+            record = self.record(position) if position != own_position else None
+            if record is not None:
+                results.append({**record, "similarity": round(score, 4)})
+        return results[:k]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "indexed": len(self.index),
+            "inventory": self.index.base_size,
+            "served": len(self._records),
+            "trained": self.index.trained,
+            "trainings": self.index.trainings
+        }
+
+
+def recall_table(vectors: np.ndarray, queries: np.ndarray, k: int, nprobes: Sequence[int]) -> List[Dict[str, float]]:
+    """Recall@k and mean latency of each nprobe setting, and of brute force"""
+    index = IVFIndex(vectors.shape[1], base_size=len(vectors), capacity=1)
+    started = time.perf_counter()
+    index.build_base(vectors)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    truth = [set(index.exact_search(query, k)[0].tolist()) for query in queries]
+    rows = [{"nprobe": "exact", "recall": 1.0, "ms": (time.perf_counter() - started) / len(queries) * 1000}]
+    for nprobe in nprobes:
+        started = time.perf_counter()
+        found = [index.search(query, k, nprobe)[0] for query in queries]
+        elapsed = time.perf_counter() - started
+        recall = np.mean([len(truth[i] & set(f.tolist())) / k for i, f in enumerate(found)])
+        rows.append({"nprobe": nprobe, "recall": float(recall), "ms": elapsed / len(queries) * 1000})
+    rows[0]["build_seconds"] = build_seconds
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF index against brute force")
+    parser.add_argument("--designs", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    from catalog import load_catalog
+    from inventory import synthetic_inventory
+    from main import SIMILARITY_TAGS, STORY_KEYWORDS
+
+    catalog = load_catalog()
+    inventory = synthetic_inventory(catalog, args.designs, list(STORY_KEYWORDS))
+    vectors = DesignEncoder(catalog, SIMILARITY_TAGS).encode_inventory(inventory)
+    queries = vectors[np.random.default_rng(1).choice(len(vectors), args.queries, replace=False)]
+
+    rows = recall_table(vectors, queries, args.k, args.nprobe)
+    print(f"{args.designs} designs, {vectors.shape[1]} dims, index built in {rows[0]['build_seconds']:.1f}s")
+    print(f"{'nprobe':>8} {'recall@' + str(args.k):>10} {'ms/query':>10}")
+    for row in rows:
+        print(f"{row['nprobe']:>8} {row['recall']:>10.3f} {row['ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
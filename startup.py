@@ -2,11 +2,20 @@
 """
 Jewelry Recommender - Startup Script
 Run this script to start the jewelry recommendation application
+
+    python startup.py                  # development: install, reload, open a browser
+    python startup.py --production     # pre-forked workers sharing preloaded state
 """
 
+import argparse
+import importlib.util
 import os
+import select
+import signal
+import socket
 import sys
 import subprocess
+import time
 import webbrowser
 from pathlib import Path
 
@@ -81,8 +90,202 @@ def start_server():
     except Exception as e:
         print(f"❌ Error starting server: {e}")
 
+def production_environment(workers: int):
+    """Size each worker's pools to its share of the CPUs; read when main is imported"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    per_worker = str(max(1, cpus // workers))
+    for name in ("LUMIERE_EXECUTOR_WORKERS", "LUMIERE_MAX_IN_FLIGHT",
+                 "LUMIERE_BATCH_WORKERS", "LUMIERE_IMAGE_WORKERS"):
+        os.environ.setdefault(name, per_worker)
+    # Sessions must be visible to every worker
+    if workers > 1:
+        os.environ.setdefault("LUMIERE_SESSION_BACKEND", "sqlite")
+
+def server_options(args) -> dict:
+    """uvicorn settings; uvloop and httptools when installed"""
+    return {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+        "timeout_graceful_shutdown": args.graceful_timeout,
+        "access_log": False,
+        "log_level": "info"
+    }
+
+class Supervisor:
+    """Pre-fork worker manager.
+
+    The parent imports the app and warms it up once, then forks the
+    workers, so the catalog, keyword matchers, inventory and similarity
+    index are shared copy-on-write. Every worker serves the same
+    listening socket. Crashed workers are replaced. SIGHUP replaces the
+    workers one at a time, each only after its replacement reports ready.
+    SIGTERM and SIGINT stop them gracefully.
+    """
+
+    def __init__(self, app_module, sock: socket.socket, workers: int, options: dict,
+                 cpu_affinity: bool = False, ready_timeout: float = 60, graceful_timeout: float = 30):
+        self.app_module = app_module
+        self.sock = sock
+        self.worker_count = workers
+        self.options = options
+        self.ready_timeout = ready_timeout
+        self.graceful_timeout = graceful_timeout
+        self.cpus = sorted(os.sched_getaffinity(0)) if cpu_affinity and hasattr(os, "sched_setaffinity") else []
+        self.workers = {}
+        self.stopping = False
+        self.restart_requested = False
+
+    def spawn(self, slot: int):
+        """Fork a worker for ``slot``; returns its pid and a pipe that signals readiness"""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self.run_worker(slot, write_fd)
+        os.close(write_fd)
+        self.workers[pid] = slot
+        return pid, read_fd
+
+    def run_worker(self, slot: int, ready_fd: int):
+        import threading
+        import uvicorn
+        
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        if self.cpus:
+            os.sched_setaffinity(0, {self.cpus[slot % len(self.cpus)]})
+        
+        def report_ready():
+            self.app_module.worker_ready.wait()
+            try:
+                os.write(ready_fd, b"1")
+            except OSError:
+                pass  # Replacements after a crash are not waited on
+            os.close(ready_fd)
+        
+        threading.Thread(target=report_ready, daemon=True).start()
+        exit_code = 1
+        try:
+            uvicorn.Server(uvicorn.Config(self.app_module.app, **self.options)).run(sockets=[self.sock])
+            exit_code = 0
+        finally:
+            os._exit(exit_code)
+
+    def wait_ready(self, pid: int, ready_fd: int) -> bool:
+        """True once the worker has warmed up; False if it exits or times out first"""
+        try:
+            readable, _, _ = select.select([ready_fd], [], [], self.ready_timeout)
+            return bool(readable) and os.read(ready_fd, 1) == b"1"
+        finally:
+            os.close(ready_fd)
+
+    def stop_worker(self, pid: int):
+        """SIGTERM, then SIGKILL if it has not exited after the graceful timeout"""
+        self.workers.pop(pid, None)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while time.monotonic() < deadline:
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                return
+            time.sleep(0.1)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def rolling_restart(self):
+        print(f"🔄 Rolling restart of {len(self.workers)} workers")
+        for old_pid, slot in list(self.workers.items()):
+            pid, ready_fd = self.spawn(slot)
+            if not self.wait_ready(pid, ready_fd):
+                print(f"❌ Replacement worker {pid} did not become ready; keeping the rest")
+                self.stop_worker(pid)
+                return
+            self.stop_worker(old_pid)
+            print(f"   worker {old_pid} replaced by {pid}")
+
+    def reap(self):
+        """Replace workers that exited on their own"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            slot = self.workers.pop(pid, None)
+            if slot is not None and not self.stopping:
+                print(f"⚠️  Worker {pid} exited with status {status}; restarting it")
+                os.close(self.spawn(slot)[1])
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "restart_requested", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "stopping", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "stopping", True))
+        
+        pending = [self.spawn(slot) for slot in range(self.worker_count)]
+        ready = sum(self.wait_ready(pid, ready_fd) for pid, ready_fd in pending)
+        print(f"✅ {ready}/{self.worker_count} workers ready (loop={self.options['loop']}, http={self.options['http']})")
+        
+        while not self.stopping:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            self.reap()
+            time.sleep(0.5)
+        
+        print("👋 Stopping workers...")
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+        self.sock.close()
+
+def start_production_server(args):
+    """Preload and warm up the app, then serve it from pre-forked workers"""
+    import gc
+    
+    production_environment(args.workers)
+    
+    family = socket.AF_INET6 if ":" in args.host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    
+    print(f"📦 Preloading the catalog and warming up {args.workers} workers...")
+    import main as app_module
+    if app_module.inventory is not None:
+        app_module.similar_designs.build()
+    app_module.warm_up()
+    # Keep the preloaded objects out of the collector, so it never writes
+    # to their shared pages
+    gc.freeze()
+    
+    print(f"🚀 Serving on http://{args.host}:{args.port} (pid {os.getpid()}; SIGHUP for a rolling restart)")
+    Supervisor(app_module, sock, args.workers, server_options(args), cpu_affinity=args.cpu_affinity,
+               ready_timeout=args.ready_timeout, graceful_timeout=args.graceful_timeout).run()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the jewelry recommender")
+    parser.add_argument("--production", action="store_true",
+                        help="Pre-forked workers; no dependency install, reload or browser")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("LUMIERE_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.environ.get("LUMIERE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LUMIERE_PORT", "8000")))
+    parser.add_argument("--cpu-affinity", action="store_true",
+                        default=os.environ.get("LUMIERE_CPU_AFFINITY", "0") == "1",
+                        help="Pin each worker to one CPU")
+    parser.add_argument("--ready-timeout", type=float, default=60,
+                        help="Seconds a new worker has to warm up")
+    parser.add_argument("--graceful-timeout", type=float, default=30,
+                        help="Seconds a stopping worker has to finish its requests")
+    return parser.parse_args()
+
 def main():
     """Main startup function"""
+    args = parse_args()
+    
     print("💎 Jewelry Recommender - AI-Powered Custom Design Assistant")
     print("=" * 60)
     
@@ -96,6 +299,10 @@ def main():
     if not check_requirements():
         return
     
+    if args.production:
+        start_production_server(args)
+        return
+    
     # Create static directory
     create_static_directory()
     
@@ -0,0 +1,258 @@
+"""
+In-memory, precompressed static assets.
+
+Every file under the static directory is read once, at startup or when
+the directory changes, and text assets are compressed ahead of time with
+gzip and, when the ``brotli`` package is installed, brotli. A request is
+answered from memory with the smallest encoding its ``Accept-Encoding``
+allows, and a matching ``If-None-Match`` gets a bodyless 304.
+
+Each encoding has its own ETag (the content digest plus an encoding
+suffix), so caches that key on ``Vary: Accept-Encoding`` never confuse
+the compressed and identity bodies.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import formatdate
+from pathlib import Path
+from typing import Any, Collection, Dict, Mapping, Optional, Tuple
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone covers every browser
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Smaller bodies are not worth a compressed variant
+MIN_COMPRESS_BYTES = 512
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# Preference order when the client accepts several encodings equally
+ENCODINGS = ("br", "gzip", "identity")
+
+
+@dataclass(frozen=True)
+class StaticAsset:
+    """One file held in memory with its precompressed bodies"""
+    content_type: str
+    digest: str
+    last_modified: str
+    bodies: Mapping[str, bytes]
+    cache_control: str
+
+    def etag(self, encoding: str) -> str:
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest}{suffix}"'
+
+
+def compress(data: bytes) -> Dict[str, bytes]:
+    """Compressed variants of ``data`` that are actually smaller than it"""
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def load_asset(path: Path, cache_control: str) -> StaticAsset:
+    data = path.read_bytes()
+    # Starlette's Response appends the charset to text/ types itself
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    bodies = {"identity": data}
+    if len(data) >= MIN_COMPRESS_BYTES and content_type.startswith(COMPRESSIBLE_TYPES):
+        bodies.update(compress(data))
+    return StaticAsset(
+        content_type=content_type,
+        digest=hashlib.blake2b(data, digest_size=12).hexdigest(),
+        last_modified=formatdate(path.stat().st_mtime, usegmt=True),
+        bodies=bodies,
+        cache_control=cache_control
+    )
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Encoding -> q-value; ``*`` stands for any encoding not listed"""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(header: Optional[str], available: Collection[str]) -> Optional[str]:
+    """Best encoding of ``available`` for an ``Accept-Encoding`` header, or None if none is acceptable"""
+    if not header:
+        return "identity"
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*")
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        if encoding not in available:
+            continue
+        q = accepted.get(encoding, wildcard)
+        if q is None:
+            # identity stays acceptable unless refused explicitly
+            q = 0.001 if encoding == "identity" else 0.0
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header covers ``etag`` (weak comparison)"""
+    if header.strip() == "*":
+        return True
+    return etag in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+class StaticAssets:
+    """Static directory held in memory, reloaded when its files change.
+
+    Like the catalog watcher, a reload builds a complete new mapping and
+    publishes it with one assignment, so requests never see a partly
+    loaded directory.
+    """
+
+    def __init__(self, directory: Path, interval: float = 2.0, max_age: int = 3600,
+                 no_cache: Tuple[str, ...] = ("index.html",)):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.max_age = max_age
+        self.no_cache = no_cache
+        self.reloads = 0
+        self.failures = 0
+        self.served: Dict[Tuple[str, int], int] = {}
+        self.bytes_sent: Dict[str, int] = {}
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._stamp = self._directory_stamp()
+        self.assets: Dict[str, StaticAsset] = self._load()
+        self.loaded_at = time.time()
+
+    def _directory_stamp(self) -> Tuple[Tuple[str, int, int], ...]:
+        stamp = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                stamp.append((os.path.join(root, name), stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(stamp))
+
+    def _load(self) -> Dict[str, StaticAsset]:
+        assets = {}
+        for path in sorted(self.directory.rglob("*")):
+            if not path.is_file():
+                continue
+            name = path.relative_to(self.directory).as_posix()
+            # HTML is revalidated on every visit so a deploy shows up immediately
+            cache_control = "no-cache" if name in self.no_cache else f"public, max-age={self.max_age}"
+            assets[name] = load_asset(path, cache_control)
+        return assets
+
+    def reload(self) -> bool:
+        """Reload the directory; returns whether a new set of assets was published"""
+        with self._reload_lock:
+            self._stamp = self._directory_stamp()
+            try:
+                assets = self._load()
+            except OSError as e:
+                self.failures += 1
+                logger.warning("Static asset reload from %s failed, keeping the loaded copy: %s",
+                               self.directory, e)
+                return False
+            self.assets = assets
+            self.loaded_at = time.time()
+            self.reloads += 1
+            return True
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="static-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            if self._directory_stamp() != self._stamp:
+                self.reload()
+
+    def _count(self, encoding: str, status: int, sent: int):
+        # Counters are only read for stats, so the GIL-atomic dict updates suffice
+        self.served[(encoding, status)] = self.served.get((encoding, status), 0) + 1
+        self.bytes_sent[encoding] = self.bytes_sent.get(encoding, 0) + sent
+
+    def response(self, name: str, headers: Mapping[str, str], method: str = "GET") -> Response:
+        """Response for asset ``name`` given the request headers"""
+        asset = self.assets.get(name)
+        if asset is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+
+        encoding = choose_encoding(headers.get("accept-encoding"), asset.bodies)
+        if encoding is None:
+            return Response(status_code=406)
+
+        response_headers = {
+            "ETag": asset.etag(encoding),
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, response_headers["ETag"]):
+            self._count(encoding, 304, 0)
+            return Response(status_code=304, headers=response_headers)
+
+        body = asset.bodies[encoding]
+        self._count(encoding, 200, len(body))
+        if method == "HEAD":
+            response_headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=response_headers, media_type=asset.content_type)
+        return Response(body, headers=response_headers, media_type=asset.content_type)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "assets": {
+                name: {encoding: len(body) for encoding, body in asset.bodies.items()}
+                for name, asset in self.assets.items()
+            },
+            "brotli": brotli is not None,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "watching": self._thread is not None
+        }
@@ -0,0 +1,77 @@
+"""
+Compiled keyword matcher for story analysis.
+
+All keyword tables are compiled once into a token trie so a story is
+tokenized and matched in a single pass, on word boundaries.
+"""
+
+import re
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Apostrophes split words, so a possessive like "love's" still yields "love"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Suffixes accepted after a keyword so "loved" or "hiking" still match
+INFLECTION_SUFFIXES = ("s", "es", "d", "ed", "ing")
+
+# (table, label, keyword) triples recorded at a terminal trie node
+Hit = Tuple[str, str, str]
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def inflections(word: str) -> Set[str]:
+    """Return the keyword plus the simple inflected forms we accept"""
+    forms = {word}
+    forms.update(word + suffix for suffix in INFLECTION_SUFFIXES)
+    if word.endswith("e"):
+        forms.add(word[:-1] + "ing")
+    if word.endswith("y"):
+        forms.add(word[:-1] + "ies")
+    return forms
+
+
+class KeywordMatcher:
+    """Token trie built from named keyword tables.
+
+    ``tables`` maps a table name to ``{label: [keywords]}``. Keywords may
+    be multi-word phrases; only the last word of a phrase is inflected.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, Iterable[str]]]):
+        self.tables = {name: list(labels) for name, labels in tables.items()}
+        self._root: Dict[str, dict] = {}
+        for table, labels in tables.items():
+            for label, keywords in labels.items():
+                for keyword in keywords:
+                    self._add(keyword, (table, label, keyword))
+
+    def _add(self, keyword: str, hit: Hit):
+        words = tokenize(keyword)
+        if not words:
+            return
+        for last in inflections(words[-1]):
+            node = self._root
+            for word in words[:-1] + [last]:
+                node = node.setdefault(word, {})
+            node.setdefault(None, []).append(hit)
+
+    def match(self, text: str) -> Dict[str, Dict[str, Set[str]]]:
+        """Return ``{table: {label: {matched keywords}}}`` for the text"""
+        results: Dict[str, Dict[str, Set[str]]] = {table: {} for table in self.tables}
+        tokens = tokenize(text)
+        root = self._root
+        for start in range(len(tokens)):
+            node = root.get(tokens[start])
+            position = start + 1
+            while node is not None:
+                for table, label, keyword in node.get(None, ()):
+                    results[table].setdefault(label, set()).add(keyword)
+                if position >= len(tokens):
+                    break
+                node = node.get(tokens[position])
+                position += 1
+        return results
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget test: a fresh worker must answer its first
+recommendation within COLD_START_BUDGET_SECONDS.
+Run with pytest, or directly: python test_coldstart.py
+"""
+
+from coldstart import COLD_START_BUDGET_SECONDS, measure_cold_start
+
+
+def test_cold_start_within_budget():
+    # The test launches its own server on a free port; nothing needs to be running
+    result = measure_cold_start()
+    assert result["first_request_seconds"] <= COLD_START_BUDGET_SECONDS, (
+        f"first recommendation after {result['first_request_seconds']:.2f}s, "
+        f"budget {COLD_START_BUDGET_SECONDS:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the story keyword matcher.
+Run with pytest, or directly: python test_story_matcher.py
+"""
+
+from story_matcher import KeywordMatcher, inflections, tokenize
+
+MATCHER = KeywordMatcher({
+    "themes": {
+        "romantic": ["love", "first kiss"],
+        "vintage": ["grandmother", "antique"],
+        "adventurous": ["adventure", "hike", "beach"]
+    },
+    "emotions": {"love": ["love"]}
+})
+
+
+def test_possessives_split_off():
+    assert tokenize("Love's first kiss") == ["love", "s", "first", "kiss"]
+    assert tokenize("grandmother’s ring") == ["grandmother", "s", "ring"]
+
+
+def test_possessives_match_keywords():
+    result = MATCHER.match("love's first kiss")
+    assert result["themes"]["romantic"] == {"love", "first kiss"}
+    assert result["emotions"]["love"] == {"love"}
+    assert MATCHER.match("my grandmother's ring")["themes"] == {"vintage": {"grandmother"}}
+    assert MATCHER.match("our adventures' end")["themes"] == {"adventurous": {"adventure"}}
+
+
+def test_inflections_match_keywords():
+    assert MATCHER.match("we loved it")["themes"] == {"romantic": {"love"}}
+    assert MATCHER.match("a loving couple")["emotions"] == {"love": {"love"}}
+    assert MATCHER.match("hiking every weekend")["themes"] == {"adventurous": {"hike"}}
+    assert MATCHER.match("long walks on beaches")["themes"] == {"adventurous": {"beach"}}
+    assert MATCHER.match("we loved hiking")["themes"] == {"romantic": {"love"}, "adventurous": {"hike"}}
+    assert "ladies" in inflections("lady")
+
+
+def test_adverbs_do_not_match():
+    assert "lovely" not in inflections("love")
+    assert MATCHER.match("a lovely antiquely styled day")["themes"] == {}
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")